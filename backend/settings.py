@@ -47,6 +47,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'ecommerce.instrumentation.PerformanceMiddleware',  # First, so its total covers every other layer
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -131,6 +132,57 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Cache
+# Local memory by default; point CACHE_BACKEND/CACHE_LOCATION at a shared
+# backend (e.g. Redis or Memcached) in production so catalog cache
+# invalidation reaches every worker process.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'pmart'),
+    }
+}
+CATALOG_CACHE_TIMEOUT = int(os.getenv('CATALOG_CACHE_TIMEOUT', '300'))  # Seconds
+
+# Re-render catalog snapshots after every catalog write. Off by default:
+# schedule build_catalog_snapshot --stale instead, which keeps the work
+# off the request path (stock changes from orders are never refreshed inline)
+CATALOG_SNAPSHOT_AUTO_REFRESH = os.getenv('CATALOG_SNAPSHOT_AUTO_REFRESH', 'False') == 'True'
+
+# Catalog change feed (/store/catalog/changes/): how far new tokens trail
+# the clock, and how long deletions are remembered
+CATALOG_CHANGES_LAG = int(os.getenv('CATALOG_CHANGES_LAG', '5'))  # Seconds
+CATALOG_TOMBSTONE_RETENTION_DAYS = int(os.getenv('CATALOG_TOMBSTONE_RETENTION_DAYS', '30'))
+
+# Largest order attachment accepted, and how old an unreferenced stored
+# attachment must be before gc_order_files removes it
+ORDER_FILE_MAX_SIZE = int(os.getenv('ORDER_FILE_MAX_SIZE', str(10 * 1024 * 1024)))  # Bytes
+ORDER_FILE_GC_GRACE = int(os.getenv('ORDER_FILE_GC_GRACE', '3600'))  # Seconds
+
+# How long a checkout holds stock for a cart before the hold expires
+STOCK_RESERVATION_TTL = int(os.getenv('STOCK_RESERVATION_TTL', '900'))  # Seconds
+
+# Performance instrumentation: fraction of requests (0-1) that get a
+# Server-Timing header and a log line on the 'ecommerce.perf' logger
+PERF_SAMPLE_RATE = float(os.getenv('PERF_SAMPLE_RATE', '0.05'))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'ecommerce.perf': {
+            'handlers': ['console'],
+            'level': os.getenv('PERF_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}
+
 # Email Configuration
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = 'smtp.gmail.com'
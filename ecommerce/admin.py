@@ -25,6 +25,12 @@ class ImageAdmin(admin.ModelAdmin):
     list_display = ('product', 'url', 'alt_text')
     search_fields = ('url', 'alt_text')
 
+@admin.register(StockReservation)
+class StockReservationAdmin(admin.ModelAdmin):
+    list_display = ('cart', 'product', 'quantity', 'created_at', 'expires_at')
+    search_fields = ('cart', 'product__name')
+    readonly_fields = ('created_at',)
+
 @admin.register(Contact)
 class ContactAdmin(admin.ModelAdmin):
     list_display = ('name', 'email', 'subject', 'created_at')
@@ -42,4 +48,26 @@ class OrderAdmin(admin.ModelAdmin):
     list_display = ('customer_name', 'customer_email', 'platform', 'total_amount', 'created_at', 'status')
     list_filter = ('platform', 'status')
     search_fields = ('customer_name', 'customer_email')
-    readonly_fields = ('created_at',) 
\ No newline at end of file
+    readonly_fields = ('created_at',) 
+
+@admin.register(OrderDailyRollup)
+class OrderDailyRollupAdmin(admin.ModelAdmin):
+    list_display = ('day', 'platform', 'status', 'orders', 'revenue')
+    list_filter = ('platform', 'status')
+    date_hierarchy = 'day'
+
+
+@admin.register(ProductDailyRollup)
+class ProductDailyRollupAdmin(admin.ModelAdmin):
+    list_display = ('day', 'product_id', 'status', 'quantity', 'revenue')
+    list_filter = ('status',)
+    search_fields = ('product_id',)
+    date_hierarchy = 'day'
+
+
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'status', 'attempts', 'next_attempt_at', 'created_at', 'sent_at')
+    list_filter = ('status',)
+    search_fields = ('subject', 'last_error')
+    readonly_fields = ('created_at', 'sent_at', 'claimed_at', 'claimed_by')
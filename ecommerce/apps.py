@@ -0,0 +1,9 @@
+from django.apps import AppConfig
+
+
+class EcommerceConfig(AppConfig):
+    name = 'ecommerce'
+
+    def ready(self):
+        # Connect the model signal handlers that keep derived catalog data in sync
+        from . import signals  # noqa: F401
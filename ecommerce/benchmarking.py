@@ -0,0 +1,116 @@
+"""Shared helpers for the benchmark management commands."""
+import logging
+import os
+import shutil
+import statistics
+import tempfile
+import time
+from contextlib import contextmanager
+
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from .synthetic import PRESETS
+
+# Loggers that write a line per request: rejected orders (sold out) and
+# sampled slow queries are part of a benchmark, not news
+NOISY_LOGGERS = {'django.request': logging.ERROR, 'ecommerce.perf': logging.WARNING}
+
+
+def add_catalog_arguments(parser, default_shape):
+    """``--preset``, ``--products`` and ``--categories`` for a command that seeds a synthetic catalog."""
+    parser.add_argument('--preset', choices=sorted(PRESETS),
+                        help='Seed the catalog shape of a generate_fixtures preset.')
+    parser.add_argument('--products', type=int,
+                        help=f"Number of synthetic products to seed (default {default_shape['products']}).")
+    parser.add_argument('--categories', type=int,
+                        help=f"Number of synthetic categories to seed (default {default_shape['categories']}).")
+
+
+def resolve_catalog_shape(options, default_shape):
+    """Fill in ``products`` and ``categories`` from the preset, or the defaults, unless given explicitly."""
+    shape = PRESETS[options['preset']] if options['preset'] else default_shape
+    for key in ('products', 'categories'):
+        if options[key] is None:
+            options[key] = shape[key]
+
+
+@contextmanager
+def isolated_database(keepdb=False, verbosity=0, on_disk=False):
+    """
+    Run the enclosed block against a throwaway test database.
+
+    Benchmarks seed large synthetic catalogs, so they must never run against
+    the real database. This also switches email to the locmem backend.
+
+    SQLite test databases live in shared-cache memory by default, where
+    concurrent writers fail instead of waiting for the lock; pass
+    ``on_disk=True`` for benchmarks that write from several threads.
+    """
+    old_name = connection.settings_dict['NAME']
+    test_settings = connection.settings_dict.setdefault('TEST', {})
+    old_test_name = test_settings.get('NAME')
+    temp_dir = None
+    if on_disk and connection.vendor == 'sqlite' and not old_test_name:
+        temp_dir = tempfile.mkdtemp(prefix='pmart-bench-')
+        test_settings['NAME'] = os.path.join(temp_dir, 'bench.sqlite3')
+
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=verbosity, autoclobber=True, keepdb=keepdb)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=verbosity, keepdb=keepdb)
+        teardown_test_environment()
+        test_settings['NAME'] = old_test_name
+        if temp_dir:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+@contextmanager
+def benchmark_environment(on_disk=False, **settings):
+    """
+    A throwaway database with per-request logging and perf sampling off.
+
+    ``settings`` are overridden for the duration of the block on top of
+    ``PERF_SAMPLE_RATE=0``.
+    """
+    levels = {name: logging.getLogger(name).level for name in NOISY_LOGGERS}
+    for name, level in NOISY_LOGGERS.items():
+        logging.getLogger(name).setLevel(level)
+    try:
+        with isolated_database(on_disk=on_disk), override_settings(PERF_SAMPLE_RATE=0, **settings):
+            yield
+    finally:
+        for name, level in levels.items():
+            logging.getLogger(name).setLevel(level)
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(samples):
+    """Latency summary in milliseconds for a list of durations in seconds."""
+    return {
+        'count': len(samples),
+        'mean_ms': statistics.fmean(samples) * 1000 if samples else 0.0,
+        'p50_ms': percentile(samples, 50) * 1000,
+        'p95_ms': percentile(samples, 95) * 1000,
+        'p99_ms': percentile(samples, 99) * 1000,
+    }
+
+
+def time_calls(func, args_list):
+    """Call ``func`` once per argument tuple and return the durations in seconds."""
+    durations = []
+    for args in args_list:
+        started = time.perf_counter()
+        func(*args)
+        durations.append(time.perf_counter() - started)
+    return durations
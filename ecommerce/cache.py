@@ -0,0 +1,286 @@
+"""
+Versioned read-through cache for catalog responses.
+
+Every cache key embeds a global catalog version. Writes to the catalog bump
+the version (see ``signals.py``) instead of deleting keys, so stale entries
+are never read again and simply expire.
+
+JSON responses are cached as rendered bytes together with their gzip and
+deflate encodings, so compression happens once per version and key rather
+than on every request, and a hit is served without rendering.
+
+The version lives in each process's cache, so HTTP validators are read from
+the database instead (see ``catalog_state``): every process hands out the
+same ETag for the same catalog, whichever process made the last write.
+"""
+import gzip
+import hashlib
+import math
+import re
+import time
+import zlib
+from datetime import timezone as dt_timezone
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Min
+from django.db.models.functions import Now
+from django.http import HttpResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_vary_headers, quote_etag
+from django.utils.dateparse import parse_datetime
+from django.utils.http import http_date, urlencode
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from .models import CatalogTombstone, Category, Product, StockReservation
+
+CATALOG_VERSION_KEY = 'catalog:version'
+
+# Query parameters that change the content of a catalog response
+CACHED_QUERY_PARAMS = (
+    'categories', 'sort', 'search', 'page', 'page_size', 'pagination', 'cursor', 'fields', 'expand', 'sideload',
+)
+
+
+# Encodings stored with cached JSON bodies, in order of preference
+CATALOG_ENCODINGS = ('gzip', 'deflate')
+
+# Bodies shorter than this are not worth compressing (as in GZipMiddleware)
+COMPRESS_MIN_LENGTH = 200
+
+ACCEPT_ENCODING_RE = re.compile(r'^\s*([^\s;,]+)\s*(?:;\s*q\s*=\s*([0-9.]+))?\s*$')
+
+
+def get_catalog_timeout():
+    return getattr(settings, 'CATALOG_CACHE_TIMEOUT', 300)
+
+
+def catalog_entry_timeout():
+    """
+    ``CATALOG_CACHE_TIMEOUT``, cut short at the next stock hold expiry.
+
+    Listings hide products whose stock is all held, and an expiring hold
+    brings them back without any write that would bump the version.
+    """
+    timeout = get_catalog_timeout()
+    next_expiry = StockReservation.objects.filter(expires_at__gt=Now()).aggregate(next=Min('expires_at'))['next']
+    if next_expiry is not None:
+        timeout = min(timeout, max(math.ceil((next_expiry - timezone.now()).total_seconds()), 1))
+    return timeout
+
+
+def get_catalog_version():
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        # Seed from the clock rather than 1 so an evicted version key can
+        # never bring back entries cached under an earlier version
+        cache.add(CATALOG_VERSION_KEY, time.time_ns() // 1000, timeout=None)
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+
+def bump_catalog_version():
+    try:
+        return cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:  # Key missing or evicted
+        return get_catalog_version()
+
+
+def normalize_query_params(query_params):
+    """The cache-relevant query parameters in a canonical, sorted form."""
+    normalized = {}
+    for name in CACHED_QUERY_PARAMS:
+        value = query_params.get(name)
+        if value is None or not value.strip():
+            continue
+        value = value.strip()
+        if name in ('categories', 'fields', 'expand', 'sideload'):
+            value = ','.join(sorted({item.strip() for item in value.split(',') if item.strip()}))
+        elif name == 'search':
+            value = ' '.join(value.lower().split())
+        normalized[name] = value
+    return sorted(normalized.items())
+
+
+def catalog_cache_key(scope, request, view_kwargs=None):
+    parts = [
+        request.get_host(),  # Pagination links are absolute URLs
+        urlencode(sorted((view_kwargs or {}).items())),
+        urlencode(normalize_query_params(request.query_params)),
+    ]
+    digest = hashlib.md5('|'.join(parts).encode('utf-8')).hexdigest()
+    return f'catalog:{get_catalog_version()}:{scope}:{digest}'
+
+
+def negotiate_encoding(request):
+    """The preferred ``CATALOG_ENCODINGS`` entry the client accepts, or ``None`` for identity."""
+    accepted = {}
+    for item in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        match = ACCEPT_ENCODING_RE.match(item)
+        if not match:
+            continue
+        try:
+            quality = float(match.group(2)) if match.group(2) else 1.0
+        except ValueError:
+            continue
+        accepted[match.group(1).lower()] = quality
+    candidates = [
+        encoding for encoding in CATALOG_ENCODINGS
+        if accepted.get(encoding, accepted.get('*', 0)) > 0
+    ]
+    if not candidates:
+        return None
+    return max(candidates, key=lambda encoding: accepted.get(encoding, accepted.get('*', 0)))
+
+
+def compress_body(body):
+    """``body`` and its stored encodings; small bodies are kept uncompressed only."""
+    encoded = {'identity': body}
+    if len(body) >= COMPRESS_MIN_LENGTH:
+        encoded['gzip'] = gzip.compress(body, mtime=0)  # mtime=0 keeps the bytes stable
+        encoded['deflate'] = zlib.compress(body)  # HTTP "deflate" is the zlib format
+    return encoded
+
+
+def encoded_response(encoded, request, content_type):
+    """A response with the best stored encoding of a body for ``request``."""
+    encoding = negotiate_encoding(request)
+    if encoding not in encoded:
+        encoding = None
+    response = HttpResponse(encoded[encoding or 'identity'], content_type=content_type)
+    if encoding:
+        response['Content-Encoding'] = encoding
+    response['Content-Length'] = str(len(response.content))
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
+
+
+def _timestamp(value):
+    """Unix time of a timestamp column read with a raw cursor (a string on SQLite)."""
+    if isinstance(value, str):
+        value = parse_datetime(value)
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value, dt_timezone.utc)
+    return value.timestamp()
+
+
+def catalog_state():
+    """
+    ``(fingerprint, last_modified)`` of the catalog, in one query on indexed columns.
+
+    Product and category writes move ``updated_at`` (feature and image writes
+    touch their product), deletions leave a tombstone, and stock holds change
+    what is available: the newest of each, with the number of unexpired
+    holds, changes with every write from any process and whenever a hold
+    expires. ``last_modified`` is the Unix time of the newest write.
+    """
+    tables = {
+        'products': Product._meta.db_table,
+        'categories': Category._meta.db_table,
+        'tombstones': CatalogTombstone._meta.db_table,
+        'holds': StockReservation._meta.db_table,
+    }
+    sql = (
+        'SELECT (SELECT MAX(updated_at) FROM {products}), (SELECT MAX(updated_at) FROM {categories}), '
+        '(SELECT MAX(id) FROM {tombstones}), (SELECT MAX(deleted_at) FROM {tombstones}), '
+        '(SELECT MAX(id) FROM {holds}), (SELECT COUNT(*) FROM {holds} WHERE expires_at > %s)'
+    ).format(**tables)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [connection.ops.adapt_datetimefield_value(timezone.now())])
+        state = cursor.fetchone()
+    timestamps = [_timestamp(value) for value in (state[0], state[1], state[3]) if value is not None]
+    return '|'.join(str(value) for value in state), int(max(timestamps, default=0))
+
+
+def catalog_etag(scope, request, view_kwargs=None, fingerprint=None):
+    """
+    A strong ETag for a catalog response.
+
+    It changes whenever the catalog in the database does (see
+    ``catalog_state``), and differs between representations (JSON, browsable
+    API, each content encoding) of the same resource.
+    """
+    if fingerprint is None:
+        fingerprint, _ = catalog_state()
+    parts = [
+        fingerprint,
+        scope,
+        getattr(request, 'accepted_media_type', '') or '',
+        negotiate_encoding(request) or '',
+        catalog_cache_key(scope, request, view_kwargs),
+    ]
+    return quote_etag(hashlib.sha1('|'.join(parts).encode('utf-8')).hexdigest())
+
+
+def conditional_catalog_response(scope):
+    """
+    Answer conditional GETs of a catalog view method with 304 Not Modified.
+
+    The check runs before the view, so a matching ``If-None-Match`` or
+    ``If-Modified-Since`` costs one query (``catalog_state``) and never
+    reaches the cache, the listing queries or a serializer.
+    """
+    def decorator(view_method):
+        @wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            fingerprint, last_modified = catalog_state()
+            etag = catalog_etag(scope, request, kwargs, fingerprint=fingerprint)
+            not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if not_modified is not None:
+                not_modified['ETag'] = etag
+                # The ETag differs per media type and encoding, so caches must key the 304 the same way
+                patch_vary_headers(not_modified, ('Accept', 'Accept-Encoding'))
+                return not_modified
+
+            response = view_method(self, request, *args, **kwargs)
+            if response.status_code == 200:
+                response['ETag'] = etag
+                response['Last-Modified'] = http_date(last_modified)
+                patch_vary_headers(response, ('Accept', 'Accept-Encoding'))
+            return response
+        return wrapper
+    return decorator
+
+
+def cached_catalog_response(scope):
+    """
+    Cache successful responses of a catalog view method.
+
+    JSON responses are cached rendered and compressed (see ``compress_body``)
+    and served in the encoding the client accepts. For other renderers, such
+    as the browsable API, the serialized data is cached and rendered per
+    request.
+    """
+    def decorator(view_method):
+        @wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            key = catalog_cache_key(scope, request, kwargs)
+            renderer = getattr(request, 'accepted_renderer', None)
+            if type(renderer) is JSONRenderer:
+                key = f'{key}:{request.accepted_media_type}'
+                encoded = cache.get(key)
+                if encoded is None:
+                    response = view_method(self, request, *args, **kwargs)
+                    if response.status_code != 200:
+                        return response
+                    body = renderer.render(response.data, request.accepted_media_type, self.get_renderer_context())
+                    encoded = compress_body(body)
+                    cache.set(key, encoded, catalog_entry_timeout())
+                content_type = request.accepted_media_type
+                if renderer.charset:
+                    content_type = f'{content_type}; charset={renderer.charset}'
+                return encoded_response(encoded, request, content_type)
+
+            data = cache.get(key)
+            if data is not None:
+                return Response(data)
+
+            response = view_method(self, request, *args, **kwargs)
+            if response.status_code == 200:
+                cache.set(key, response.data, catalog_entry_timeout())
+            return response
+        return wrapper
+    return decorator
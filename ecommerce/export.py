@@ -0,0 +1,32 @@
+"""Streaming NDJSON export of the whole catalog."""
+from rest_framework.renderers import JSONRenderer
+
+from .models import Product
+from .serializers import ProductSerializer
+
+EXPORT_CHUNK_SIZE = 2000
+
+_renderer = JSONRenderer()
+
+
+def iter_catalog_ndjson(chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yield the catalog as NDJSON, one ``ProductSerializer`` object per line.
+
+    Products are read with a server-side ``iterator()`` whose chunks are
+    prefetched as a unit, so memory stays flat whatever the catalog size.
+    Each yielded value holds the lines of one chunk.
+    """
+    products = Product.objects.for_catalog().order_by('pk').iterator(chunk_size=chunk_size)
+    chunk = []
+    for product in products:
+        chunk.append(product)
+        if len(chunk) >= chunk_size:
+            yield _render_chunk(chunk)
+            chunk = []
+    if chunk:
+        yield _render_chunk(chunk)
+
+
+def _render_chunk(products):
+    return b''.join(_renderer.render(data) + b'\n' for data in ProductSerializer(products, many=True).data)
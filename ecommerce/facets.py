@@ -0,0 +1,82 @@
+"""
+Facet counts for the storefront filter sidebar.
+
+All price and rating buckets come from a single aggregate with conditional
+``Count``s, and the per-category counts from one ``GROUP BY``, so a facets
+request costs two queries however many buckets there are.
+"""
+from django.db.models import Count, Q
+
+# (key, lower bound inclusive, upper bound exclusive or None)
+PRICE_BUCKETS = (
+    ('0-50', 0, 50),
+    ('50-100', 50, 100),
+    ('100-250', 100, 250),
+    ('250-500', 250, 500),
+    ('500+', 500, None),
+)
+
+# Cumulative "n stars and up" buckets
+RATING_BUCKETS = (
+    ('4+', 4),
+    ('3+', 3),
+    ('2+', 2),
+    ('1+', 1),
+)
+
+
+def _price_filter(low, high):
+    condition = Q(price__gte=low)
+    if high is not None:
+        condition &= Q(price__lt=high)
+    return condition
+
+
+def bucket_counts(queryset):
+    """Total, price bucket and rating bucket counts of ``queryset`` in one query."""
+    aggregates = {'total': Count('pk')}
+    for index, (_, low, high) in enumerate(PRICE_BUCKETS):
+        aggregates[f'price_{index}'] = Count('pk', filter=_price_filter(low, high))
+    for index, (_, minimum) in enumerate(RATING_BUCKETS):
+        aggregates[f'rating_{index}'] = Count('pk', filter=Q(rating__gte=minimum))
+    counts = queryset.order_by().aggregate(**aggregates)
+
+    return {
+        'total': counts['total'],
+        'price': [
+            {'key': key, 'min': low, 'max': high, 'count': counts[f'price_{index}']}
+            for index, (key, low, high) in enumerate(PRICE_BUCKETS)
+        ],
+        'rating': [
+            {'key': key, 'min': minimum, 'count': counts[f'rating_{index}']}
+            for index, (key, minimum) in enumerate(RATING_BUCKETS)
+        ],
+    }
+
+
+def category_counts(queryset):
+    """Matching products per category, in one grouped query."""
+    rows = (
+        queryset.order_by()
+        .values('category_id', 'category__name', 'category__slug')
+        .annotate(count=Count('pk'))
+        .order_by('category__name')
+    )
+    return [
+        {'id': row['category_id'], 'name': row['category__name'], 'slug': row['category__slug'], 'count': row['count']}
+        for row in rows
+    ]
+
+
+def compute_facets(queryset, unfiltered_by_category):
+    """
+    Facets for the current filter.
+
+    Category counts are computed over ``unfiltered_by_category`` (the same
+    filter without the category selection) so the sidebar can show how many
+    products each other category would add; price and rating counts honour
+    every filter.
+    """
+    facets = bucket_counts(queryset)
+    facets['categories'] = category_counts(unfiltered_by_category)
+    return facets
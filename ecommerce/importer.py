@@ -0,0 +1,177 @@
+"""
+Incremental catalog importer.
+
+Incoming categories and products are diffed against the existing rows by
+primary key and only the differences are written, with ``bulk_create`` and
+``bulk_update`` in batches. Features and images of a product are replaced
+only when the incoming list differs from the stored one. Callers run the
+import inside a single transaction so readers never see a partial catalog.
+"""
+from collections import Counter
+
+from django.utils import timezone
+
+from .models import Category, Feature, Image, Product
+from .signals import bulk_child_writes, catalog_bulk_changed
+
+CATEGORY_FIELDS = ['name', 'icon', 'description', 'slug']
+PRODUCT_FIELDS = ['name', 'price', 'description', 'category_id', 'stock', 'rating', 'reviews', 'is_featured', 'color']
+
+# Source keys that differ from the model field names (the frontend data uses camelCase)
+PRODUCT_KEY_ALIASES = {'isFeatured': 'is_featured', 'category': 'category_id'}
+
+
+def normalize_category(data):
+    record = {'id': str(data['id'])}
+    for field in CATEGORY_FIELDS:
+        if field in data:
+            record[field] = data[field]
+    return record
+
+
+def normalize_product(data):
+    """
+    Map a source product to model field values.
+
+    Returns ``(record, category, features, images)``; ``category`` is the
+    embedded category record (as produced by the NDJSON export) or ``None``,
+    and ``features``/``images`` are ``None`` when the source does not list them.
+    """
+    record = {'id': str(data['id'])}
+    category = None
+    for key, value in data.items():
+        field = PRODUCT_KEY_ALIASES.get(key, key)
+        if field == 'category_id' and isinstance(value, dict):
+            category = normalize_category(value)
+            value = category['id']
+        if field in PRODUCT_FIELDS:
+            record[field] = value
+
+    features = data.get('features')
+    if features is not None:
+        features = [feature['text'] if isinstance(feature, dict) else feature for feature in features]
+
+    images = data.get('images')
+    if images is not None:
+        images = [
+            (image['url'], image.get('alt_text') or image.get('alt')) if isinstance(image, dict) else (image, None)
+            for image in images
+        ]
+    return record, category, features, images
+
+
+class CatalogImporter:
+    def __init__(self, batch_size=1000):
+        self.batch_size = batch_size
+        self.stats = Counter()
+        self.seen_category_ids = set()
+        self.seen_product_ids = set()
+        self.changed_category_ids = set()
+        self.changed_product_ids = set()
+
+    def _upsert(self, model, records, fields, name):
+        """Create missing rows and update changed ones; returns the ids written."""
+        existing = model.objects.in_bulk([record['id'] for record in records])
+        to_create = []
+        to_update = []
+        update_fields = set()
+        for record in records:
+            obj = existing.get(record['id'])
+            if obj is None:
+                to_create.append(model(**record))
+                continue
+            changed = False
+            for field in fields:
+                if field not in record:
+                    continue
+                value = model._meta.get_field(field).to_python(record[field])
+                if getattr(obj, field) != value:
+                    setattr(obj, field, value)
+                    update_fields.add(field)
+                    changed = True
+            if changed:
+                to_update.append(obj)
+
+        model.objects.bulk_create(to_create, batch_size=self.batch_size)
+        if to_update:
+            # bulk_update skips auto_now, so stamp updated_at explicitly
+            now = timezone.now()
+            for obj in to_update:
+                obj.updated_at = now
+            model.objects.bulk_update(to_update, sorted(update_fields | {'updated_at'}), batch_size=self.batch_size)
+        self.stats[f'{name}_created'] += len(to_create)
+        self.stats[f'{name}_updated'] += len(to_update)
+        self.stats[f'{name}_unchanged'] += len(records) - len(to_create) - len(to_update)
+        return {obj.pk for obj in to_create} | {obj.pk for obj in to_update}
+
+    def import_categories(self, categories):
+        records = {}
+        for data in categories:
+            record = normalize_category(data)
+            records[record['id']] = record  # Last occurrence wins
+        self.seen_category_ids.update(records)
+        self.changed_category_ids |= self._upsert(Category, list(records.values()), CATEGORY_FIELDS, 'categories')
+
+    def import_products(self, products):
+        """Upsert one batch of source products, with embedded categories, features and images."""
+        records = {}
+        categories = {}
+        children = {}
+        for data in products:
+            record, category, features, images = normalize_product(data)
+            records[record['id']] = record
+            # Embedded categories repeat on every product; upsert each once per import
+            if category is not None and category['id'] not in self.seen_category_ids:
+                categories[category['id']] = category
+            children[record['id']] = (features, images)
+
+        if categories:
+            self.import_categories(categories.values())
+        self.seen_product_ids.update(records)
+        self.changed_product_ids |= self._upsert(Product, list(records.values()), PRODUCT_FIELDS, 'products')
+        self._sync_children(Feature, children, 0, lambda product_id, text: Feature(product_id=product_id, text=text),
+                            ('text',), 'features')
+        self._sync_children(Image, children, 1,
+                            lambda product_id, image: Image(product_id=product_id, url=image[0], alt_text=image[1]),
+                            ('url', 'alt_text'), 'images')
+
+    def _sync_children(self, model, children, position, build, fields, name):
+        """Replace the child rows of products whose incoming list differs from the stored one."""
+        wanted = {
+            product_id: lists[position] for product_id, lists in children.items() if lists[position] is not None
+        }
+        if not wanted:
+            return
+        current = {product_id: [] for product_id in wanted}
+        for row in model.objects.filter(product_id__in=list(wanted)).order_by('id').values_list('product_id', *fields):
+            current[row[0]].append(row[1] if len(fields) == 1 else tuple(row[1:]))
+
+        stale = [product_id for product_id, items in wanted.items() if current[product_id] != list(items)]
+        if not stale:
+            return
+        # finish() refreshes derived data for all changed products at once
+        with bulk_child_writes():
+            model.objects.filter(product_id__in=stale).delete()
+        model.objects.bulk_create(
+            [build(product_id, item) for product_id in stale for item in wanted[product_id]],
+            batch_size=self.batch_size,
+        )
+        self.changed_product_ids.update(stale)
+        self.stats[f'{name}_replaced'] += len(stale)
+
+    def prune(self):
+        """Delete categories and products that were not in the source."""
+        stale_products = set(Product.objects.values_list('pk', flat=True)) - self.seen_product_ids
+        stale_categories = set(Category.objects.values_list('pk', flat=True)) - self.seen_category_ids
+        stale_products = sorted(stale_products)
+        for start in range(0, len(stale_products), self.batch_size):
+            Product.objects.filter(pk__in=stale_products[start:start + self.batch_size]).delete()
+        if stale_categories:
+            Category.objects.filter(pk__in=stale_categories).delete()
+        self.stats['products_deleted'] += len(stale_products)
+        self.stats['categories_deleted'] += len(stale_categories)
+
+    def finish(self):
+        """Refresh search, snapshots and caches for everything the bulk writes touched."""
+        catalog_bulk_changed(self.changed_product_ids, self.changed_category_ids)
+        return self.stats
@@ -0,0 +1,136 @@
+"""
+Per-request performance instrumentation.
+
+``PerformanceMiddleware`` samples a fraction of requests
+(``PERF_SAMPLE_RATE``) and, for each sampled request, records:
+
+- ``db``: SQL query count and time, via ``connection.execute_wrapper``
+- ``serialize``: time spent in DRF serializers' ``to_representation``
+- ``template``: time spent rendering templates (``timed('template')``)
+
+The totals are sent back in a ``Server-Timing`` header and logged as one
+JSON line on the ``ecommerce.perf`` logger. Requests that are not sampled
+only pay for a context variable lookup at each measuring point.
+"""
+import json
+import logging
+import random
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger('ecommerce.perf')
+
+# Metrics of the request being handled, or None when it is not sampled
+_current = ContextVar('ecommerce_perf_metrics', default=None)
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.durations = {}  # Name -> seconds
+        self.counts = {}  # Name -> number of measured calls
+        self._active = set()  # Names currently being measured, for reentrancy
+
+    def add(self, name, seconds, count=1):
+        self.durations[name] = self.durations.get(name, 0.0) + seconds
+        self.counts[name] = self.counts.get(name, 0) + count
+
+    def as_dict(self):
+        return {
+            name: {'ms': round(seconds * 1000, 2), 'count': self.counts[name]}
+            for name, seconds in self.durations.items()
+        }
+
+
+def get_sample_rate():
+    return getattr(settings, 'PERF_SAMPLE_RATE', 0.0)
+
+
+@contextmanager
+def timed(name):
+    """
+    Add the time spent in the block to the current request's ``name`` metric.
+
+    Nested blocks with the same name (a serializer serializing a nested
+    serializer) are only counted once, by the outermost block.
+    """
+    metrics = _current.get()
+    if metrics is None or name in metrics._active:
+        yield
+        return
+    metrics._active.add(name)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics._active.discard(name)
+        metrics.add(name, time.perf_counter() - started)
+
+
+def _record_query(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.add('db', time.perf_counter() - started)
+
+
+class TimedSerializerMixin:
+    """Serializer mixin that reports ``to_representation`` time as ``serialize``."""
+
+    def to_representation(self, instance):
+        with timed('serialize'):
+            return super().to_representation(instance)
+
+
+@contextmanager
+def collect():
+    """Measure everything inside the block; yields the ``RequestMetrics``."""
+    metrics = RequestMetrics()
+    token = _current.set(metrics)
+    try:
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(_record_query))
+            yield metrics
+    finally:
+        _current.reset(token)
+
+
+def server_timing(metrics, total):
+    entries = []
+    for name, data in metrics.as_dict().items():
+        entries.append(f'{name};dur={data["ms"]};desc="{data["count"]}"')
+    entries.append(f'total;dur={round(total * 1000, 2)}')
+    return ', '.join(entries)
+
+
+class PerformanceMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        sample_rate = get_sample_rate()
+        if sample_rate <= 0 or (sample_rate < 1 and random.random() >= sample_rate):
+            return self.get_response(request)
+
+        started = time.perf_counter()
+        with collect() as metrics:
+            response = self.get_response(request)
+        total = time.perf_counter() - started
+
+        response['Server-Timing'] = server_timing(metrics, total)
+        logger.info(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 2),
+            **metrics.as_dict(),
+        }))
+        return response
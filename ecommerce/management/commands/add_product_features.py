@@ -1,5 +1,8 @@
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 from ecommerce.models import Product, Feature
+from ecommerce.signals import bulk_child_writes, catalog_bulk_changed
+import json
 
 # Map of product names to specialized features
 PRODUCT_FEATURES = {
@@ -126,22 +129,92 @@ PRODUCT_FEATURES = {
 }
 
 class Command(BaseCommand):
-    help = 'Delete all features and add unique, technical features to each product.'
+    help = (
+        'Sync product features with PRODUCT_FEATURES (or a mapping file). '
+        'Only missing features are inserted and stale ones deleted, in one transaction.'
+    )
 
-    def handle(self, *args, **options):
-        # Step 1: Delete all features
-        Feature.objects.all().delete()
-        self.stdout.write(self.style.WARNING('All existing features deleted.'))
+    def add_arguments(self, parser):
+        parser.add_argument('--mapping', help='JSON file mapping product names to lists of feature texts.')
+        parser.add_argument('--keep-unmapped', action='store_true',
+                            help='Leave features of products without a mapping untouched instead of removing them.')
+        parser.add_argument('--dry-run', action='store_true', help='Print the diff and counts without writing.')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def load_mapping(self, path):
+        if not path:
+            return PRODUCT_FEATURES
+        try:
+            with open(path, 'r', encoding='utf-8') as file:
+                mapping = json.load(file)
+        except (OSError, json.JSONDecodeError) as e:
+            raise CommandError(f'Could not read mapping {path}: {e}')
+        if not isinstance(mapping, dict):
+            raise CommandError('The mapping must be a JSON object of product name -> list of features')
+        return mapping
 
-        # Step 2: Add specialized features to each product
-        updated_count = 0
-        for product in Product.objects.all():
-            features = PRODUCT_FEATURES.get(product.name)
-            if features:
-                for feature_text in features:
-                    Feature.objects.create(product=product, text=feature_text)
-                    self.stdout.write(self.style.SUCCESS(f'Added feature "{feature_text}" to "{product.name}"'))
-                updated_count += 1
+    def compute_diff(self, mapping, keep_unmapped):
+        """Return (feature ids to delete, (product, text) pairs to insert, unmapped products)."""
+        products = dict(Product.objects.values_list('id', 'name'))
+        wanted = {}
+        unmapped = []
+        for product_id, name in products.items():
+            if name in mapping:
+                wanted[product_id] = set(mapping[name])
             else:
-                self.stdout.write(self.style.ERROR(f'No feature mapping found for product: {product.name}'))
-        self.stdout.write(self.style.SUCCESS(f'Features updated for {updated_count} products.'))
+                unmapped.append((product_id, name))
+
+        to_delete = []
+        present = set()
+        for feature_id, product_id, text in Feature.objects.order_by('id').values_list('id', 'product_id', 'text'):
+            if product_id not in wanted:
+                if not keep_unmapped:
+                    to_delete.append((feature_id, product_id, text))
+            elif text in wanted[product_id] and (product_id, text) not in present:
+                present.add((product_id, text))
+            else:  # Stale or duplicate
+                to_delete.append((feature_id, product_id, text))
+
+        to_insert = [
+            (product_id, text)
+            for product_id, name in products.items() if product_id in wanted
+            for text in mapping[name] if (product_id, text) not in present
+        ]
+        # A mapping may list the same text twice; insert it once
+        to_insert = list(dict.fromkeys(to_insert))
+        return to_delete, to_insert, unmapped, products
+
+    def handle(self, *args, **options):
+        mapping = self.load_mapping(options['mapping'])
+        batch_size = options['batch_size']
+
+        with transaction.atomic():
+            to_delete, to_insert, unmapped, products = self.compute_diff(mapping, options['keep_unmapped'])
+
+            for product_id, name in unmapped:
+                self.stdout.write(self.style.ERROR(f'No feature mapping found for product: {name}'))
+
+            if options['dry_run'] or options['verbosity'] > 1:
+                for _, product_id, text in to_delete:
+                    self.stdout.write(self.style.WARNING(f'- {products[product_id]}: {text}'))
+                for product_id, text in to_insert:
+                    self.stdout.write(self.style.SUCCESS(f'+ {products[product_id]}: {text}'))
+
+            changed_products = {product_id for _, product_id, _ in to_delete} | {product_id for product_id, _ in to_insert}
+            if not options['dry_run']:
+                delete_ids = [feature_id for feature_id, _, _ in to_delete]
+                # Derived data is refreshed once below rather than per row
+                with bulk_child_writes():
+                    for start in range(0, len(delete_ids), batch_size):
+                        Feature.objects.filter(pk__in=delete_ids[start:start + batch_size]).delete()
+                Feature.objects.bulk_create(
+                    [Feature(product_id=product_id, text=text) for product_id, text in to_insert],
+                    batch_size=batch_size,
+                )
+                catalog_bulk_changed(product_ids=changed_products)
+
+        verb = 'Would update' if options['dry_run'] else 'Updated'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} features for {len(changed_products)} products: '
+            f'{len(to_insert)} added, {len(to_delete)} removed.'
+        ))
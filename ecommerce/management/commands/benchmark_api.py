@@ -0,0 +1,201 @@
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+
+from ecommerce import search
+from ecommerce.benchmarking import add_catalog_arguments, benchmark_environment, resolve_catalog_shape, summarize
+from ecommerce.instrumentation import collect
+from ecommerce.models import Category, Product
+from ecommerce.synthetic import generate_catalog, sample_terms
+
+SCENARIOS = ('list', 'search', 'by-category', 'featured', 'order-create')
+
+# Metrics compared against a baseline, and whether higher is better
+COMPARED_METRICS = (
+    ('p50_ms', False),
+    ('p95_ms', False),
+    ('p99_ms', False),
+    ('throughput_rps', True),
+    ('queries_per_request', False),
+)
+
+
+DEFAULT_SHAPE = {'products': 5000, 'categories': 20}
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a synthetic catalog in a throwaway database and load-test the store API '
+        'with concurrent in-process clients. Optionally save or compare a JSON baseline.'
+    )
+
+    def add_arguments(self, parser):
+        add_catalog_arguments(parser, DEFAULT_SHAPE)
+        parser.add_argument('--requests', type=int, default=200, help='Measured requests per scenario.')
+        parser.add_argument('--warmup', type=int, default=10, help='Unmeasured requests per scenario.')
+        parser.add_argument('--threads', type=int, default=4, help='Number of concurrent clients.')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for the catalog and the request mix.')
+        parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                            help=f'Comma-separated subset of: {", ".join(SCENARIOS)}.')
+        parser.add_argument('--warm-cache', action='store_true',
+                            help='Keep the catalog response cache on (by default every request misses it).')
+        parser.add_argument('--save', metavar='PATH', help='Write the results to a JSON baseline file.')
+        parser.add_argument('--baseline', metavar='PATH', help='Compare the results against a saved baseline.')
+        parser.add_argument('--max-regression', type=float, default=None, metavar='PCT',
+                            help='Fail if p95 latency or queries per request regress by more than PCT percent.')
+
+    def handle(self, *args, **options):
+        resolve_catalog_shape(options, DEFAULT_SHAPE)
+
+        scenarios = [name.strip() for name in options['scenarios'].split(',') if name.strip()]
+        unknown = set(scenarios) - set(SCENARIOS)
+        if unknown:
+            raise CommandError(f'Unknown scenarios: {", ".join(sorted(unknown))}')
+
+        baseline = None
+        if options['baseline']:
+            if not os.path.exists(options['baseline']):
+                raise CommandError(f"Baseline {options['baseline']} not found")
+            with open(options['baseline'], 'r', encoding='utf-8') as file:
+                baseline = json.load(file)
+
+        cache_settings = {} if options['warm_cache'] else {
+            'CACHES': {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}},
+        }
+        with benchmark_environment(on_disk=True, **cache_settings):
+            self.stdout.write(f"Seeding {options['products']} products...")
+            started = time.perf_counter()
+            generate_catalog(categories=options['categories'], products=options['products'], seed=options['seed'])
+            search.rebuild_index()
+            self.stdout.write(f'Seeded in {time.perf_counter() - started:.1f}s')
+
+            plans = self.build_plans(options)
+            results = {}
+            for name in scenarios:
+                results[name] = self.run_scenario(plans[name], options)
+                self.report(name, results[name], (baseline or {}).get('scenarios', {}).get(name))
+
+        payload = {
+            'settings': {
+                key: options[key]
+                for key in ('products', 'categories', 'requests', 'threads', 'seed', 'warm_cache')
+            },
+            'scenarios': results,
+        }
+        if options['save']:
+            with open(options['save'], 'w', encoding='utf-8') as file:
+                json.dump(payload, file, indent=2, sort_keys=True)
+            self.stdout.write(self.style.SUCCESS(f"Saved results to {options['save']}"))
+
+        if baseline is not None:
+            if baseline.get('settings') != payload['settings']:
+                self.stdout.write(self.style.WARNING(
+                    f"Baseline was recorded with different settings: {baseline.get('settings')}"
+                ))
+            self.check_regressions(results, baseline.get('scenarios', {}), options['max_regression'])
+
+    def build_plans(self, options):
+        """A deterministic list of ``(method, path, data)`` requests per scenario."""
+        rng = random.Random(options['seed'])
+        count = options['requests'] + options['warmup']
+        page_count = max(1, Product.objects.available().count() // 20)
+        slugs = list(Category.objects.values_list('slug', flat=True))
+        in_stock = list(Product.objects.filter(stock__gte=10).values_list('id', flat=True))
+        terms = sample_terms(count, seed=options['seed'])
+
+        def order(index):
+            items = [{'id': product_id, 'quantity': 1} for product_id in rng.sample(in_stock, min(3, len(in_stock)))]
+            details = {
+                'items': items,
+                'total': '10.00',
+                'email': f'bench{index}@example.com',
+                'name': f'Bench {index}',
+            }
+            return ('post', '/store/orders/', {'platform': 'fiverr', 'orderDetails': json.dumps(details)})
+
+        return {
+            'list': [('get', f'/store/products/?page={rng.randint(1, page_count)}&page_size=20', None)
+                     for _ in range(count)],
+            'search': [('get', f'/store/products/?search={term}', None) for term in terms],
+            'by-category': [('get', f'/store/products/by-category/{rng.choice(slugs)}/', None) for _ in range(count)],
+            'featured': [('get', '/store/products/featured/', None) for _ in range(count)],
+            'order-create': [order(index) for index in range(count)],
+        }
+
+    def run_scenario(self, plan, options):
+        warmup, measured = plan[:options['warmup']], plan[options['warmup']:]
+        lock = threading.Lock()
+        latencies = []
+        queries = []
+        statuses = {}
+
+        def send(request, record=True):
+            method, path, data = request
+            client = Client()
+            try:
+                with collect() as metrics:
+                    started = time.perf_counter()
+                    if method == 'post':
+                        response = client.post(path, data)
+                    else:
+                        response = client.get(path)
+                    elapsed = time.perf_counter() - started
+            finally:
+                connection.close()  # Each worker thread has its own connection
+            if record:
+                with lock:
+                    latencies.append(elapsed)
+                    queries.append(metrics.counts.get('db', 0))
+                    statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        for request in warmup:
+            send(request, record=False)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['threads']) as executor:
+            list(executor.map(send, measured))
+        wall_time = time.perf_counter() - started
+
+        summary = summarize(latencies)
+        summary['throughput_rps'] = len(measured) / wall_time if wall_time else 0.0
+        summary['queries_per_request'] = sum(queries) / len(queries) if queries else 0.0
+        summary['statuses'] = {str(code): count for code, count in sorted(statuses.items())}
+        return summary
+
+    def report(self, name, summary, previous=None):
+        line = (
+            f"{name:<13} p50 {summary['p50_ms']:7.2f} ms  p95 {summary['p95_ms']:7.2f} ms  "
+            f"p99 {summary['p99_ms']:7.2f} ms  {summary['throughput_rps']:7.1f} req/s  "
+            f"{summary['queries_per_request']:5.1f} queries/req  statuses {summary['statuses']}"
+        )
+        self.stdout.write(line)
+        if previous:
+            changes = []
+            for metric, _ in COMPARED_METRICS:
+                before = previous.get(metric)
+                if before:
+                    changes.append(f'{metric} {(summary[metric] - before) / before * 100:+.1f}%')
+            self.stdout.write(f"{'':<13} vs baseline: {', '.join(changes)}")
+
+    def check_regressions(self, results, baseline, max_regression):
+        if max_regression is None:
+            return
+        regressions = []
+        for name, summary in results.items():
+            previous = baseline.get(name)
+            if not previous:
+                continue
+            for metric in ('p95_ms', 'queries_per_request'):
+                before = previous.get(metric)
+                if before and (summary[metric] - before) / before * 100 > max_regression:
+                    regressions.append(f'{name} {metric}: {before:.2f} -> {summary[metric]:.2f}')
+        if regressions:
+            raise CommandError('Regressions beyond {}%:\n  {}'.format(max_regression, '\n  '.join(regressions)))
+        self.stdout.write(self.style.SUCCESS(f'No regression beyond {max_regression}% against the baseline.'))
@@ -0,0 +1,73 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.utils.text import compress_string
+
+from ecommerce.benchmarking import add_catalog_arguments, benchmark_environment, resolve_catalog_shape, summarize
+from ecommerce.models import Category
+from ecommerce.synthetic import generate_catalog
+
+# How each mode requests a response, and whether it gzips the body itself
+# on every request the way GZipMiddleware would
+MODES = {
+    'identity': ('', False),
+    'gzip-per-request': ('', True),
+    'precompressed': ('gzip, deflate', False),
+}
+
+
+DEFAULT_SHAPE = {'products': 2000, 'categories': 20}
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a synthetic catalog in a throwaway database and compare CPU time per request '
+        'and bytes on the wire for uncompressed, per-request gzip and precompressed cached '
+        'catalog responses.'
+    )
+
+    def add_arguments(self, parser):
+        add_catalog_arguments(parser, DEFAULT_SHAPE)
+        parser.add_argument('--requests', type=int, default=200, help='Measured requests per endpoint and mode.')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for the synthetic catalog.')
+
+    def handle(self, *args, **options):
+        resolve_catalog_shape(options, DEFAULT_SHAPE)
+
+        with benchmark_environment():
+            self.stdout.write(f"Seeding {options['products']} products...")
+            generate_catalog(categories=options['categories'], products=options['products'], seed=options['seed'])
+            slug = Category.objects.values_list('slug', flat=True).first()
+            endpoints = [
+                '/store/products/?page_size=100',
+                '/store/products/?page_size=100&expand=description,category',
+                f'/store/products/by-category/{slug}/',
+                '/store/categories/',
+            ]
+
+            client = Client()
+            for path in endpoints:
+                self.stdout.write(path)
+                for mode, (accept_encoding, compress_each) in MODES.items():
+                    self.report(mode, *self.measure(client, path, accept_encoding, compress_each, options['requests']))
+
+    def measure(self, client, path, accept_encoding, compress_each, count):
+        """Per-request CPU and wall times in seconds, and the body size in bytes, with a warm cache."""
+        client.get(path, HTTP_ACCEPT_ENCODING=accept_encoding)
+        cpu_times, wall_times = [], []
+        size = 0
+        for _ in range(count):
+            cpu_started, wall_started = time.process_time(), time.perf_counter()
+            response = client.get(path, HTTP_ACCEPT_ENCODING=accept_encoding)
+            body = compress_string(response.content) if compress_each else response.content
+            cpu_times.append(time.process_time() - cpu_started)
+            wall_times.append(time.perf_counter() - wall_started)
+            size = len(body)
+        return summarize(cpu_times), summarize(wall_times), size
+
+    def report(self, mode, cpu, wall, size):
+        self.stdout.write(
+            f"  {mode:<17} cpu {cpu['mean_ms']:7.3f} ms/req  wall p50 {wall['p50_ms']:7.3f} ms  "
+            f"p95 {wall['p95_ms']:7.3f} ms  {size:9d} bytes"
+        )
@@ -0,0 +1,88 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+
+from ecommerce.benchmarking import benchmark_environment, summarize
+from ecommerce.models import Category, Order, Product
+
+
+class Command(BaseCommand):
+    help = 'Place concurrent orders for a few products and check that stock is never oversold.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8, help='Number of concurrent clients.')
+        parser.add_argument('--orders', type=int, default=400, help='Total order attempts across all clients.')
+        parser.add_argument('--products', type=int, default=3, help='Number of contended products.')
+        parser.add_argument('--stock', type=int, default=50, help='Starting stock of each product.')
+        parser.add_argument('--items', type=int, default=2, help='Products per order.')
+
+    def handle(self, *args, **options):
+        product_count = options['products']
+        items_per_order = min(options['items'], product_count)
+        initial_stock = options['stock']
+
+        with benchmark_environment(on_disk=True):
+            category = Category.objects.create(id='bench', name='Bench', slug='bench')
+            product_ids = [f'bench-{index}' for index in range(product_count)]
+            Product.objects.bulk_create([
+                Product(id=product_id, name=product_id, price='10.00', description='', category=category,
+                        stock=initial_stock, rating='5.0', color='#000000')
+                for product_id in product_ids
+            ])
+
+            lock = threading.Lock()
+            outcomes = {'created': 0, 'rejected': 0, 'errors': 0}
+            latencies = []
+
+            def place_order(attempt):
+                chosen = [product_ids[(attempt + offset) % product_count] for offset in range(items_per_order)]
+                details = {
+                    'items': [{'id': product_id, 'quantity': 1} for product_id in chosen],
+                    'total': '20.00',
+                    'email': f'bench{attempt}@example.com',
+                    'name': f'Bench {attempt}',
+                }
+                started = time.perf_counter()
+                try:
+                    response = Client().post('/store/orders/', {'platform': 'fiverr', 'orderDetails': json.dumps(details)})
+                finally:
+                    connection.close()  # Each worker thread has its own connection
+                elapsed = time.perf_counter() - started
+                outcome = {201: 'created', 400: 'rejected'}.get(response.status_code, 'errors')
+                with lock:
+                    outcomes[outcome] += 1
+                    latencies.append(elapsed)
+
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=options['threads']) as executor:
+                list(executor.map(place_order, range(options['orders'])))
+            wall_time = time.perf_counter() - started
+
+            stock_left = dict(Product.objects.values_list('id', 'stock'))
+            orders_placed = Order.objects.count()
+            units_sold = sum(
+                item['quantity'] for order in Order.objects.only('order_details') for item in order.order_details
+            )
+
+        summary = summarize(latencies)
+        self.stdout.write(
+            f"{outcomes['created']} orders created, {outcomes['rejected']} rejected, {outcomes['errors']} errors "
+            f"in {wall_time:.2f}s ({outcomes['created'] / wall_time:.1f} orders/s, "
+            f"{options['orders'] / wall_time:.1f} attempts/s)"
+        )
+        self.stdout.write(
+            f"latency p50 {summary['p50_ms']:.1f} ms  p95 {summary['p95_ms']:.1f} ms  p99 {summary['p99_ms']:.1f} ms"
+        )
+        self.stdout.write(f'stock left: {stock_left}')
+
+        expected_units = product_count * initial_stock - sum(stock_left.values())
+        if any(stock < 0 for stock in stock_left.values()):
+            raise CommandError('Oversold: stock went negative.')
+        if units_sold != expected_units or orders_placed != outcomes['created']:
+            raise CommandError(f'Inconsistent result: {units_sold} units in orders, {expected_units} deducted from stock.')
+        self.stdout.write(self.style.SUCCESS('No overselling: every deducted unit belongs to a committed order.'))
@@ -0,0 +1,61 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+
+from ecommerce import search
+from ecommerce.benchmarking import (
+    add_catalog_arguments, benchmark_environment, resolve_catalog_shape, summarize, time_calls
+)
+from ecommerce.models import Product
+from ecommerce.synthetic import generate_catalog, sample_terms
+
+DEFAULT_SHAPE = {'products': 100000, 'categories': 50}
+
+
+class Command(BaseCommand):
+    help = 'Benchmark FTS5 product search against the icontains search on a synthetic catalog.'
+
+    def add_arguments(self, parser):
+        add_catalog_arguments(parser, DEFAULT_SHAPE)
+        parser.add_argument('--queries', type=int, default=200, help='Number of search queries to time per path.')
+        parser.add_argument('--limit', type=int, default=5, help='Results returned per query.')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for the synthetic catalog.')
+
+    def handle(self, *args, **options):
+        resolve_catalog_shape(options, DEFAULT_SHAPE)
+
+        if not search.is_available():
+            raise CommandError('The FTS5 search index requires SQLite.')
+
+        with benchmark_environment():
+            self.stdout.write(f"Seeding {options['products']} products...")
+            started = time.perf_counter()
+            generate_catalog(categories=options['categories'], products=options['products'], seed=options['seed'])
+            indexed = search.rebuild_index()
+            self.stdout.write(f'Seeded and indexed {indexed} products in {time.perf_counter() - started:.1f}s')
+
+            limit = options['limit']
+            terms = [(term,) for term in sample_terms(options['queries'], seed=options['seed'])]
+
+            def icontains_search(term):
+                queryset = Product.objects.in_stock().filter(
+                    Q(name__icontains=term) | Q(description__icontains=term)
+                ).order_by('-is_featured')
+                return list(queryset.values_list('id', flat=True)[:limit])
+
+            def fts_search(term):
+                return list(search.top_ranked(Product.objects.in_stock(), term, limit).values_list('id', flat=True))
+
+            results = {
+                'icontains': summarize(time_calls(icontains_search, terms)),
+                'fts5': summarize(time_calls(fts_search, terms)),
+            }
+
+        for name, summary in results.items():
+            self.stdout.write(
+                f"{name:<10} mean {summary['mean_ms']:8.2f} ms  p50 {summary['p50_ms']:8.2f} ms  "
+                f"p95 {summary['p95_ms']:8.2f} ms  p99 {summary['p99_ms']:8.2f} ms"
+            )
+        speedup = results['icontains']['mean_ms'] / max(results['fts5']['mean_ms'], 1e-9)
+        self.stdout.write(self.style.SUCCESS(f'FTS5 is {speedup:.1f}x faster on average.'))
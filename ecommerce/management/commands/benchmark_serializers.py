@@ -0,0 +1,62 @@
+from django.core.management.base import BaseCommand
+
+from ecommerce.benchmarking import (
+    add_catalog_arguments, benchmark_environment, resolve_catalog_shape, summarize, time_calls
+)
+from ecommerce.models import Product
+from ecommerce.rows import ProductRows
+from ecommerce.serializers import PRODUCT_FIELD_SETS, ProductSerializer
+from ecommerce.synthetic import generate_catalog
+
+DEFAULT_SHAPE = {'products': 5000, 'categories': 20}
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a synthetic catalog in a throwaway database and compare the rows per second of '
+        'ProductSerializer and ProductRows.'
+    )
+
+    def add_arguments(self, parser):
+        add_catalog_arguments(parser, DEFAULT_SHAPE)
+        parser.add_argument('--page-size', type=int, default=100, help='Products serialized per call.')
+        parser.add_argument('--pages', type=int, default=50, help='Number of pages to time per path.')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for the synthetic catalog.')
+
+    def handle(self, *args, **options):
+        resolve_catalog_shape(options, DEFAULT_SHAPE)
+
+        page_size = options['page_size']
+        with benchmark_environment():
+            self.stdout.write(f"Seeding {options['products']} products...")
+            generate_catalog(categories=options['categories'], products=options['products'], seed=options['seed'])
+            page_count = max(1, Product.objects.available().count() // page_size)
+            pages = [(number % page_count,) for number in range(options['pages'])]
+
+            for name, fields in PRODUCT_FIELD_SETS.items():
+                rows = ProductRows(fields)
+
+                def page_queryset(number):
+                    start = number * page_size
+                    return Product.objects.available().sorted(None)[start:start + page_size]
+
+                def serializer_path(number):
+                    products = page_queryset(number).for_fields(fields)
+                    return ProductSerializer(products, many=True, fields=fields).data
+
+                def rows_path(number):
+                    return rows.serialize(list(rows.values(page_queryset(number))))
+
+                serializer_summary = summarize(time_calls(serializer_path, pages))
+                rows_summary = summarize(time_calls(rows_path, pages))
+                self.report(name, 'serializer', serializer_summary, page_size)
+                self.report(name, 'rows', rows_summary, page_size)
+                speedup = serializer_summary['mean_ms'] / max(rows_summary['mean_ms'], 1e-9)
+                self.stdout.write(self.style.SUCCESS(f'{name:<7} ProductRows is {speedup:.1f}x faster'))
+
+    def report(self, name, path, summary, page_size):
+        rows_per_second = page_size / (summary['mean_ms'] / 1000) if summary['mean_ms'] else 0.0
+        self.stdout.write(
+            f"{name:<7} {path:<11} mean {summary['mean_ms']:8.2f} ms  p95 {summary['p95_ms']:8.2f} ms  "
+            f"{rows_per_second:10.0f} rows/s"
+        )
@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from ecommerce import snapshots
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the precomputed catalog snapshots, fully, for stale rows only or for a few products.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', nargs='+', metavar='ID', help='Only re-render these products and their categories.')
+        parser.add_argument('--stale', action='store_true',
+                            help='Only re-render products and categories changed since their snapshot was built.')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Products rendered per query batch on a full rebuild.')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        with transaction.atomic():
+            if options['products']:
+                snapshots.refresh(product_ids=options['products'])
+                message = f"Refreshed snapshots for {len(options['products'])} products"
+            elif options['stale']:
+                rendered = snapshots.refresh_stale()
+                message = f'Refreshed snapshots for {rendered} stale products'
+            else:
+                rendered = snapshots.rebuild_all(batch_size=options['batch_size'])
+                message = f'Rebuilt snapshots for {rendered} products'
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f'{message} in {elapsed:.2f}s.'))
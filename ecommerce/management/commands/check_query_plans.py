@@ -0,0 +1,142 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from ecommerce.benchmarking import add_catalog_arguments, benchmark_environment, resolve_catalog_shape
+from ecommerce.models import PRODUCT_ORDERINGS, Category, Feature, Image, Product, StockReservation
+from ecommerce.synthetic import category_id, generate_catalog
+
+# Plan lines that read a table from end to end: "SCAN t", or an index walk,
+# "SCAN t USING [COVERING] INDEX i". A SEARCH line seeks into an index instead
+SCAN = re.compile(r'^SCAN (\S+)(?: USING (COVERING )?INDEX \S+)?$')
+TEMP_BTREE = re.compile(r'USE TEMP B-TREE')
+LIMIT = re.compile(r'\bLIMIT \d+')
+COUNT = re.compile(r'^SELECT COUNT\(')
+
+# Tables that grow with the catalog. The planner may legitimately scan a
+# small table such as categories as the outer loop of a join.
+LARGE_TABLES = {
+    Product._meta.db_table,
+    Feature._meta.db_table,
+    Image._meta.db_table,
+    StockReservation._meta.db_table,
+}
+
+DEFAULT_SHAPE = {'products': 1000, 'categories': 10}  # The tiny preset
+
+NO_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+
+
+def catalog_requests():
+    """``(name, path, follow_next)`` for every catalog endpoint whose queries must stay indexed."""
+    one_category = category_id(1)
+    slug = Category.objects.filter(pk=one_category).values_list('slug', flat=True).first()
+    product_id = Product.objects.available().values_list('pk', flat=True).first()
+
+    requests = [('list default', '/store/products/', False), ('list page 3', '/store/products/?page=3', False)]
+    for sort in PRODUCT_ORDERINGS:
+        requests += [
+            (f'list sort={sort}', f'/store/products/?sort={sort}', False),
+            (f'list sort={sort} category', f'/store/products/?sort={sort}&categories={one_category}', False),
+            # The second page is the one that carries a keyset condition
+            (f'list sort={sort} keyset page', f'/store/products/?sort={sort}&pagination=cursor', True),
+        ]
+    requests.append(('featured', '/store/products/featured/', False))
+    if slug is not None:
+        requests.append(('by-category', f'/store/products/by-category/{slug}/', False))
+    if product_id is not None:
+        requests.append(('detail', f'/store/products/{product_id}/', False))
+    return requests
+
+
+def request_queries(client, path, follow_next=False):
+    """The SQL of every SELECT the real view and paginator run for ``path``."""
+    with CaptureQueriesContext(connection) as context:
+        response = client.get(path)
+    if response.status_code != 200:
+        raise CommandError(f'{path} answered {response.status_code}')
+    if follow_next:
+        next_link = response.json().get('next')
+        if not next_link:
+            raise CommandError(f'{path} has no next page; seed more products')
+        return request_queries(client, next_link)
+    return [query['sql'] for query in context.captured_queries if query['sql'].startswith('SELECT')]
+
+
+def plan_problems(plan, sql):
+    """
+    The plan lines that scan a large table or sort in a temporary B-tree.
+
+    Two index walks are expected and allowed: one under a LIMIT, which walks
+    the sort index and stops after a page, and a covering index scan for
+    the page-number paginator's COUNT(*), which has to see every row.
+    """
+    limited = LIMIT.search(sql) is not None
+    counting = COUNT.match(sql) is not None
+    problems = []
+    for line in plan.splitlines():
+        detail = re.sub(r'^\d+ \d+ \d+ ', '', line.strip())
+        scan = SCAN.match(detail)
+        if scan and scan.group(1) in LARGE_TABLES:
+            index_walk = 'INDEX' in detail
+            if not ((index_walk and limited) or (scan.group(2) and counting)):
+                problems.append(detail)
+        elif TEMP_BTREE.search(detail):
+            problems.append(detail)
+    return problems
+
+
+def check_plans():
+    """``(name, sql, plan, problems)`` for every query the catalog endpoints run."""
+    results = []
+    client = Client()
+    with override_settings(CACHES=NO_CACHE, PERF_SAMPLE_RATE=0):
+        for name, path, follow_next in catalog_requests():
+            for number, sql in enumerate(request_queries(client, path, follow_next), start=1):
+                with connection.cursor() as cursor:
+                    cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                    plan = '\n'.join(' '.join(str(column) for column in row) for row in cursor.fetchall())
+                results.append((f'{name} #{number}', sql, plan, plan_problems(plan, sql)))
+    return results
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a synthetic catalog in a throwaway database, request every catalog endpoint, '
+        'run EXPLAIN QUERY PLAN on each query it made and fail if any scans a large table '
+        'or uses a temporary B-tree.'
+    )
+
+    def add_arguments(self, parser):
+        add_catalog_arguments(parser, DEFAULT_SHAPE)
+        parser.add_argument('--analyze', action='store_true',
+                            help='Run ANALYZE first, so the planner uses table statistics.')
+        parser.add_argument('--verbose-plans', action='store_true', help='Print every plan, not just failures.')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('check_query_plans reads SQLite EXPLAIN QUERY PLAN output.')
+
+        resolve_catalog_shape(options, DEFAULT_SHAPE)
+        failures = []
+        with benchmark_environment():
+            generate_catalog(categories=options['categories'], products=options['products'])
+            if options['analyze']:
+                with connection.cursor() as cursor:
+                    cursor.execute('ANALYZE')
+
+            for name, sql, plan, problems in check_plans():
+                if options['verbose_plans'] or problems:
+                    self.stdout.write(f'{name}: {sql}\n  ' + '\n  '.join(plan.splitlines()))
+                status = self.style.ERROR('FAIL') if problems else self.style.SUCCESS('ok')
+                self.stdout.write(f'{status:<4} {name}')
+                if problems:
+                    failures.append(f"{name}: {'; '.join(problems)}")
+
+        if failures:
+            raise CommandError('Query plan regressions:\n  ' + '\n  '.join(failures))
+        self.stdout.write(self.style.SUCCESS('Every catalog query is served by an index without a temporary sort.'))
+
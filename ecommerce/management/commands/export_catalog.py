@@ -0,0 +1,29 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+
+from ecommerce.export import EXPORT_CHUNK_SIZE, iter_catalog_ndjson
+
+
+class Command(BaseCommand):
+    help = 'Stream the whole catalog as NDJSON (one product per line) to a file or stdout.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', '-o', help='File to write to. Defaults to stdout.')
+        parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_SIZE, help='Products fetched per query batch.')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        lines = 0
+        if options['output']:
+            with open(options['output'], 'wb') as output:
+                for chunk in iter_catalog_ndjson(options['chunk_size']):
+                    output.write(chunk)
+                    lines += chunk.count(b'\n')
+            elapsed = time.perf_counter() - started
+            self.stderr.write(self.style.SUCCESS(f"Exported {lines} products to {options['output']} in {elapsed:.2f}s."))
+        else:
+            for chunk in iter_catalog_ndjson(options['chunk_size']):
+                sys.stdout.buffer.write(chunk)
+            sys.stdout.buffer.flush()
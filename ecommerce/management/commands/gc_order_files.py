@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from ecommerce.uploads import collect_garbage
+
+
+class Command(BaseCommand):
+    help = 'Delete stored order attachments that no order refers to (older than ORDER_FILE_GC_GRACE).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report what would be deleted without deleting.')
+
+    def handle(self, *args, **options):
+        deleted, freed = collect_garbage(dry_run=options['dry_run'])
+        verb = 'Would delete' if options['dry_run'] else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {deleted} unreferenced files ({freed} bytes).'))
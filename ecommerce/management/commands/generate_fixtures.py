@@ -0,0 +1,83 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from ecommerce import rollups, search, snapshots
+from ecommerce.cache import bump_catalog_version
+from ecommerce.models import Product
+from ecommerce.synthetic import PRESETS, generate_catalog, generate_orders, product_id
+
+
+class Command(BaseCommand):
+    help = (
+        'Fill the database with a deterministic synthetic catalog and orders. '
+        'Presets give benchmarks and query-plan checks the same dataset shape.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--preset', choices=sorted(PRESETS), default='small',
+                            help='Dataset size; the options below override single values.')
+        parser.add_argument('--categories', type=int, help='Number of categories.')
+        parser.add_argument('--products', type=int, help='Number of products.')
+        parser.add_argument('--orders', type=int, help='Number of orders.')
+        parser.add_argument('--features', type=int, default=3, help='Features per product.')
+        parser.add_argument('--images', type=int, default=1, help='Images per product.')
+        parser.add_argument('--days', type=int, default=365, help='Spread orders over this many past days.')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed; the same seed gives the same data.')
+        parser.add_argument('--batch-size', type=int, default=2000, help='Rows per bulk insert.')
+        parser.add_argument('--skip-index', action='store_true', help='Do not rebuild the search index afterwards.')
+        parser.add_argument('--rollups', action='store_true',
+                            help='Also rebuild the daily order rollups (backfill_order_rollups does the same later).')
+        parser.add_argument('--snapshots', action='store_true',
+                            help='Also rebuild the catalog snapshots (build_catalog_snapshot does the same later).')
+
+    def handle(self, *args, **options):
+        shape = dict(PRESETS[options['preset']])
+        for key in shape:
+            if options[key] is not None:
+                shape[key] = options[key]
+
+        if Product.objects.filter(pk=product_id(0)).exists():
+            raise CommandError('The database already contains synthetic products; generate fixtures into an empty database.')
+
+        self.stdout.write(
+            f"Generating {shape['categories']} categories, {shape['products']} products and "
+            f"{shape['orders']} orders (preset {options['preset']}, seed {options['seed']})..."
+        )
+        started = time.perf_counter()
+        with transaction.atomic():
+            generate_catalog(
+                categories=shape['categories'],
+                products=shape['products'],
+                features_per_product=options['features'],
+                images_per_product=options['images'],
+                seed=options['seed'],
+                batch_size=options['batch_size'],
+            )
+            self.stdout.write(f'Catalog written in {time.perf_counter() - started:.1f}s')
+
+            generate_orders(
+                orders=shape['orders'],
+                products=shape['products'],
+                days=options['days'],
+                seed=options['seed'],
+                batch_size=options['batch_size'],
+            )
+            self.stdout.write(f'Orders written in {time.perf_counter() - started:.1f}s')
+            if not options['skip_index']:
+                search.rebuild_index()
+                self.stdout.write(f'Search index rebuilt in {time.perf_counter() - started:.1f}s')
+            transaction.on_commit(bump_catalog_version)
+
+        # Derived data is rebuilt on request, each in its own transaction,
+        # so the fixtures are committed even if a rebuild is interrupted
+        if options['rollups']:
+            rollups.rebuild(chunk_size=options['batch_size'])  # bulk_create skips the rollup signals
+            self.stdout.write(f'Orders rolled up in {time.perf_counter() - started:.1f}s')
+        if options['snapshots']:
+            with transaction.atomic():
+                snapshots.rebuild_all(batch_size=options['batch_size'])
+            self.stdout.write(f'Snapshots rebuilt in {time.perf_counter() - started:.1f}s')
+
+        self.stdout.write(self.style.SUCCESS(f'Done in {time.perf_counter() - started:.1f}s.'))
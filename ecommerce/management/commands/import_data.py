@@ -1,11 +1,25 @@
-from django.core.management.base import BaseCommand
-from ecommerce.models import Category, Product
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from ecommerce.importer import CatalogImporter
 import json
 import os
 import re
+import time
 
 class Command(BaseCommand):
-    help = 'Import categories and products from data.ts file'
+    help = (
+        'Import categories and products from data.ts, a JSON file or an NDJSON stream. '
+        'Existing rows are updated in place and only changed rows are written.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--source',
+            help='Path to a .ts, .json or .ndjson file. Defaults to lib/data.ts in the workspace root.',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows read and written per batch.')
+        parser.add_argument('--prune', action='store_true', help='Delete categories and products missing from the source.')
+        parser.add_argument('--dry-run', action='store_true', help='Compute and report the changes, then roll back.')
 
     def clean_json_str(self, json_str):
         """Clean up JSON string to make it valid"""
@@ -29,110 +43,122 @@ class Command(BaseCommand):
             match = re.search(pattern, content, re.DOTALL)
             if match:
                 data_str = match.group(1)
-                self.stdout.write(f'Found {data_type} data in file')
-                
+
                 # Remove any TypeScript-specific syntax
                 data_str = re.sub(r'//.*?\n|/\*.*?\*/', '', data_str, flags=re.DOTALL)  # Remove comments
-                self.stdout.write('Removed comments')
-                
+
                 # Clean up arrays and objects
                 data_str = self.clean_json_str(data_str)
                 data_str = re.sub(r'`([^`]*)`', r'"\1"', data_str)  # Convert template literals
-                self.stdout.write('Cleaned up arrays and objects')
-                
+
                 # Convert TypeScript object to valid JSON
                 data_str = re.sub(r'(\w+):', r'"\1":', data_str)  # Quote property names
-                self.stdout.write('Converted property names')
-                
+
                 try:
                     data = json.loads(f'[{data_str}]')
                     self.stdout.write(self.style.SUCCESS(f'Successfully parsed {len(data)} {data_type}'))
                     return data
                 except json.JSONDecodeError as e:
                     self.stdout.write(self.style.ERROR(f'Error parsing {data_type}: {str(e)}'))
-                    self.stdout.write(self.style.ERROR(f'Problematic JSON: [{data_str}]'))
                     return []
             else:
                 self.stdout.write(self.style.ERROR(f'No {data_type} found in file'))
                 return []
 
-    def handle(self, *args, **kwargs):
-        # Get the path to data.ts file
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        workspace_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(current_dir))))
-        data_ts_path = os.path.join(workspace_root, 'lib', 'data.ts')
-        
-        self.stdout.write(f'Looking for data.ts at: {data_ts_path}')
-        
-        if not os.path.exists(data_ts_path):
-            self.stdout.write(self.style.ERROR(f'data.ts not found at {data_ts_path}'))
-            return
-            
-        # Clear existing data
-        self.stdout.write('Clearing existing data...')
-        Category.objects.all().delete()
-        Product.objects.all().delete()
-        
-        # Import categories
-        categories_data = self.extract_ts_data(data_ts_path, 'categories')
-        if not categories_data:
-            self.stdout.write(self.style.ERROR('No categories data found'))
-            return
-            
-        categories_map = {}  # Map category IDs to objects
-        for category_data in categories_data:
-            try:
-                self.stdout.write(f'Creating category: {category_data}')
-                category = Category.objects.create(
-                    id=category_data['id'],
-                    name=category_data['name'],
-                    icon=category_data['icon'],
-                    description=category_data['description'],
-                    slug=category_data['slug']
-                )
-                categories_map[category.id] = category
-                self.stdout.write(self.style.SUCCESS(f'Created category: {category.name}'))
-            except Exception as e:
-                self.stdout.write(self.style.ERROR(f'Error creating category {category_data.get("name", "unknown")}: {str(e)}'))
-
-        # Import products
-        products_data = self.extract_ts_data(data_ts_path, 'products')
-        if not products_data:
-            self.stdout.write(self.style.ERROR('No products data found'))
-            return
-            
-        for product_data in products_data:
-            try:
-                self.stdout.write(f'Creating product: {product_data}')
-                category_id = product_data.pop('category')
-                category = categories_map.get(category_id)
-                if not category:
-                    self.stdout.write(self.style.ERROR(f'Category {category_id} not found for product {product_data.get("name", "unknown")}'))
+    def batched(self, rows, batch_size):
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def read_ndjson(self, file_path):
+        """
+        Stream records from an NDJSON file, one object per line.
+
+        Lines are products (as written by export_catalog, with the category
+        embedded) unless they carry "type": "category".
+        """
+        with open(file_path, 'r', encoding='utf-8') as file:
+            for line_number, line in enumerate(file, start=1):
+                line = line.strip()
+                if not line:
                     continue
-                
-                # Convert isFeatured to is_featured if present
-                if 'isFeatured' in product_data:
-                    product_data['is_featured'] = product_data.pop('isFeatured')
-                
-                # Convert lists to JSON strings
-                if 'features' in product_data:
-                    product_data['features'] = json.dumps(product_data['features'])
-                if 'images' in product_data:
-                    product_data['images'] = json.dumps(product_data['images'])
-                
-                # Remove any fields not in the model
-                product_data.pop('isNew', None)
-                product_data.pop('originalPrice', None)
-                
-                product = Product.objects.create(
-                    category=category,
-                    **product_data
-                )
-                self.stdout.write(self.style.SUCCESS(f'Created product: {product.name}'))
-            except Exception as e:
-                self.stdout.write(self.style.ERROR(f'Error creating product {product_data.get("name", "unknown")}: {str(e)}'))
-
-        # Print final counts
-        category_count = Category.objects.count()
-        product_count = Product.objects.count()
-        self.stdout.write(self.style.SUCCESS(f'Import complete. Categories: {category_count}, Products: {product_count}')) 
\ No newline at end of file
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError as e:
+                    raise CommandError(f'{file_path}:{line_number}: {e}')
+
+    def run_import(self, importer, source, batch_size):
+        extension = os.path.splitext(source)[1].lower()
+
+        if extension == '.ndjson':
+            categories = []
+            for batch in self.batched(self.read_ndjson(source), batch_size):
+                products = []
+                for record in batch:
+                    if record.pop('type', 'product') == 'category':
+                        categories.append(record)
+                    else:
+                        products.append(record)
+                # Categories go first so their products can reference them
+                if categories:
+                    importer.import_categories(categories)
+                    categories = []
+                if products:
+                    importer.import_products(products)
+            return
+
+        if extension == '.json':
+            with open(source, 'r', encoding='utf-8') as file:
+                data = json.load(file)
+            if isinstance(data, list):  # A bare list of products
+                data = {'products': data}
+            categories_data = data.get('categories', [])
+            products_data = data.get('products', [])
+        else:
+            categories_data = self.extract_ts_data(source, 'categories')
+            products_data = self.extract_ts_data(source, 'products')
+            if not categories_data or not products_data:
+                raise CommandError('No categories or products data found')
+
+        for batch in self.batched(categories_data, batch_size):
+            importer.import_categories(batch)
+        for batch in self.batched(products_data, batch_size):
+            importer.import_products(batch)
+
+    def handle(self, *args, **options):
+        source = options['source']
+        if not source:
+            # Get the path to data.ts file
+            current_dir = os.path.dirname(os.path.abspath(__file__))
+            workspace_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(current_dir))))
+            source = os.path.join(workspace_root, 'lib', 'data.ts')
+
+        self.stdout.write(f'Importing from: {source}')
+        if not os.path.exists(source):
+            raise CommandError(f'{source} not found')
+
+        started = time.perf_counter()
+        importer = CatalogImporter(batch_size=options['batch_size'])
+        with transaction.atomic():
+            self.run_import(importer, source, options['batch_size'])
+            if options['prune']:
+                importer.prune()
+            stats = importer.finish()
+            if options['dry_run']:
+                transaction.set_rollback(True)
+        elapsed = time.perf_counter() - started
+
+        for kind in ('categories', 'products'):
+            self.stdout.write(
+                f"{kind.capitalize()}: {stats[f'{kind}_created']} created, {stats[f'{kind}_updated']} updated, "
+                f"{stats[f'{kind}_unchanged']} unchanged, {stats[f'{kind}_deleted']} deleted"
+            )
+        self.stdout.write(f"Features replaced for {stats['features_replaced']} products, "
+                          f"images replaced for {stats['images_replaced']} products")
+        verb = 'Dry run finished' if options['dry_run'] else 'Import complete'
+        self.stdout.write(self.style.SUCCESS(f'{verb} in {elapsed:.2f}s.'))
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from ecommerce import outbox
+
+
+class Command(BaseCommand):
+    help = 'Deliver queued outbound emails, reusing one SMTP connection per batch.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=outbox.BATCH_SIZE, help='Emails claimed and sent per SMTP connection.')
+        parser.add_argument('--max-attempts', type=int, default=outbox.MAX_ATTEMPTS, help='Attempts before an email is marked as failed.')
+        parser.add_argument('--loop', action='store_true', help='Keep polling for new emails instead of exiting when the outbox is empty.')
+        parser.add_argument('--interval', type=float, default=5.0, help='Seconds to sleep between polls with --loop.')
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = outbox.process_outbox(
+                batch_size=options['batch_size'],
+                max_attempts=options['max_attempts'],
+            )
+            if sent or failed:
+                self.stdout.write(self.style.SUCCESS(f'Sent {sent} emails, {failed} failed.'))
+            if not options['loop']:
+                if not (sent or failed):
+                    self.stdout.write('No emails due.')
+                return
+            time.sleep(options['interval'])
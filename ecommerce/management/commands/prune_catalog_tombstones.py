@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from ecommerce import changes
+
+
+class Command(BaseCommand):
+    help = 'Delete change-feed tombstones older than CATALOG_TOMBSTONE_RETENTION_DAYS.'
+
+    def handle(self, *args, **options):
+        deleted = changes.prune_tombstones()
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} tombstones.'))
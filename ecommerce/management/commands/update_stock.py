@@ -1,10 +1,19 @@
 from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models.functions import Now
+from ecommerce import snapshots
+from ecommerce.cache import bump_catalog_version
 from ecommerce.models import Product
 
 class Command(BaseCommand):
     help = 'Update the stock for all products to exactly 10'
 
     def handle(self, *args, **kwargs):
-        updated_count = Product.objects.update(stock=10)
-        update_featured = Product.objects.update(is_featured=False)
-        self.stdout.write(self.style.SUCCESS(f'Successfully updated stock for {updated_count} products.'))
\ No newline at end of file
+        with transaction.atomic():
+            updated_count = Product.objects.update(stock=10, is_featured=False, updated_at=Now())
+            # update() sends no signals. The new updated_at marks every snapshot
+            # stale for build_catalog_snapshot --stale; with auto-refresh on they
+            # are refreshed after commit like any other bulk write
+            snapshots.schedule_refresh(product_ids=Product.objects.values_list('pk', flat=True))
+            transaction.on_commit(bump_catalog_version)
+        self.stdout.write(self.style.SUCCESS(f'Successfully updated stock for {updated_count} products.'))
@@ -0,0 +1,35 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    # FTS5 is SQLite-only; other backends fall back to icontains search
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS ecommerce_product_fts USING fts5("
+        "product_id UNINDEXED, name, description, features, "
+        "tokenize = 'unicode61 remove_diacritics 2')"
+    )
+    schema_editor.execute(
+        "INSERT INTO ecommerce_product_fts (product_id, name, description, features) "
+        "SELECT p.id, p.name, p.description, COALESCE(GROUP_CONCAT(f.text, ' '), '') "
+        "FROM ecommerce_product p LEFT JOIN ecommerce_feature f ON f.product_id = p.id "
+        "GROUP BY p.id"
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute("DROP TABLE IF EXISTS ecommerce_product_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0005_remove_product_features_remove_product_images_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
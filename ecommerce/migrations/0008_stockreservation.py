@@ -0,0 +1,32 @@
+# Generated by Django 5.0.2 on 2026-10-17 22:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0007_outboundemail'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockReservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cart', models.CharField(max_length=64)),
+                ('quantity', models.PositiveIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('expires_at', models.DateTimeField()),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='ecommerce.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['product', 'expires_at'], name='reservation_product_idx'), models.Index(fields=['expires_at'], name='reservation_expiry_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='stockreservation',
+            constraint=models.UniqueConstraint(fields=('cart', 'product'), name='unique_cart_product_reservation'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.0.2 on 2026-10-17 22:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0008_stockreservation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogSnapshot',
+            fields=[
+                ('key', models.CharField(max_length=150, primary_key=True, serialize=False)),
+                ('body', models.BinaryField()),
+                ('etag', models.CharField(max_length=64)),
+                ('built_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ProductSnapshot',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='snapshot', serialize=False, to='ecommerce.product')),
+                ('category_id', models.CharField(max_length=50)),
+                ('body', models.BinaryField()),
+                ('built_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
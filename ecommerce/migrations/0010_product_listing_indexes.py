@@ -0,0 +1,37 @@
+# Generated by Django 5.0.2 on 2026-10-17 22:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0009_catalog_snapshots'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('stock__gt', 0)), fields=['is_featured', 'id', 'stock'], name='product_featured_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('stock__gt', 0)), fields=['price', 'id'], name='product_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('stock__gt', 0)), fields=['rating', 'id'], name='product_rating_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('stock__gt', 0)), fields=['category', 'is_featured', 'id'], name='product_cat_featured_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('stock__gt', 0)), fields=['category', 'price', 'id'], name='product_cat_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('stock__gt', 0)), fields=['category', 'rating', 'id'], name='product_cat_rating_idx'),
+        ),
+    ]
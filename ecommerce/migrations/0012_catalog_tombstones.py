@@ -0,0 +1,31 @@
+# Generated by Django 5.0.2 on 2026-10-17 22:55
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0011_catalog_timestamps'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('product', 'Product'), ('category', 'Category')], max_length=10)),
+                ('object_id', models.CharField(max_length=50)),
+                ('deleted_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(fields=['updated_at'], name='category_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['updated_at'], name='product_updated_idx'),
+        ),
+    ]
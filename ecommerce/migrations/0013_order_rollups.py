@@ -0,0 +1,43 @@
+# Generated by Django 5.0.2 on 2026-10-17 23:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0012_catalog_tombstones'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('platform', models.CharField(max_length=10)),
+                ('status', models.CharField(max_length=20)),
+                ('orders', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ProductDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('product_id', models.CharField(max_length=50)),
+                ('status', models.CharField(max_length=20)),
+                ('quantity', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='orderdailyrollup',
+            constraint=models.UniqueConstraint(fields=('day', 'platform', 'status'), name='order_rollup_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='productdailyrollup',
+            constraint=models.UniqueConstraint(fields=('day', 'product_id', 'status'), name='product_rollup_unique'),
+        ),
+    ]
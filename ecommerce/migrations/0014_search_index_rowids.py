@@ -0,0 +1,36 @@
+import hashlib
+
+from django.db import migrations
+
+
+def document_rowid(product_id):
+    # Frozen copy of search.document_rowid
+    digest = hashlib.blake2b(str(product_id).encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') >> 1
+
+
+def rekey_search_index(apps, schema_editor):
+    # Documents are now keyed by a rowid derived from the product id, so they
+    # can be replaced without scanning the unindexed product_id column
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT product_id, name, description, features FROM ecommerce_product_fts")
+        documents = {row[0]: row for row in cursor.fetchall()}.values()  # One per product
+        cursor.execute("DELETE FROM ecommerce_product_fts")
+        cursor.executemany(
+            "INSERT INTO ecommerce_product_fts (rowid, product_id, name, description, features) "
+            "VALUES (%s, %s, %s, %s, %s)",
+            [(document_rowid(document[0]), *document) for document in documents],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0013_order_rollups'),
+    ]
+
+    operations = [
+        migrations.RunPython(rekey_search_index, migrations.RunPython.noop),
+    ]
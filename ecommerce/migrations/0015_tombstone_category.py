@@ -0,0 +1,18 @@
+# Generated by Django 5.0.2 on 2026-10-17 23:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0014_search_index_rowids'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='catalogtombstone',
+            name='category_id',
+            field=models.CharField(blank=True, max_length=50),
+        ),
+    ]
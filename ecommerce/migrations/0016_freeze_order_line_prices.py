@@ -0,0 +1,47 @@
+from decimal import Decimal, InvalidOperation
+
+from django.db import migrations
+
+
+def _has_price(item):
+    try:
+        Decimal(str(item.get('price')))
+    except (InvalidOperation, TypeError, ValueError):
+        return False
+    return True
+
+
+def freeze_line_prices(apps, schema_editor):
+    # The rollups now value a line at its own price only; write today's
+    # price into the lines of existing orders that were saved without one
+    Order = apps.get_model('ecommerce', 'Order')
+    Product = apps.get_model('ecommerce', 'Product')
+    prices = None
+    changed = []
+    for order in Order.objects.only('order_details').iterator(chunk_size=2000):
+        if not isinstance(order.order_details, list):
+            continue
+        unpriced = [
+            item for item in order.order_details
+            if isinstance(item, dict) and item.get('id') is not None and not _has_price(item)
+        ]
+        if not unpriced:
+            continue
+        if prices is None:
+            prices = {pk: str(price) for pk, price in Product.objects.values_list('pk', 'price')}
+        for item in unpriced:
+            if str(item['id']) in prices:
+                item['price'] = prices[str(item['id'])]
+        changed.append(order)
+    Order.objects.bulk_update(changed, ['order_details'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0015_tombstone_category'),
+    ]
+
+    operations = [
+        migrations.RunPython(freeze_line_prices, migrations.RunPython.noop),
+    ]
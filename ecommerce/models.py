@@ -1,8 +1,12 @@
 from django.db import models
+from django.db.models import F, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce, Now
 from django.core.validators import MinValueValidator, MaxValueValidator
-from django.core.mail import send_mail
 from django.conf import settings
 from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .instrumentation import timed
 
 class Category(models.Model):
     id = models.CharField(max_length=50, primary_key=True)
@@ -10,12 +14,91 @@ class Category(models.Model):
     icon = models.CharField(max_length=10, default="🔧")  # Default icon
     description = models.TextField(blank=True)
     slug = models.SlugField(unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['updated_at'], name='category_updated_idx'),  # Change feed
+        ]
 
     def __str__(self):
         return self.name
 
 
 
+# Orderings for each supported 'sort' value. Every ordering ends with the
+# primary key so that rows with equal sort values have a stable order, which
+# keyset pagination relies on. Descending sorts break ties descending too so
+# a single index can serve the ordering in either direction.
+PRODUCT_ORDERINGS = {
+    'featured': ('-is_featured', '-id'),
+    'price-low-high': ('price', 'id'),
+    'price-high-low': ('-price', '-id'),
+    'rating': ('-rating', '-id'),
+    'newest': ('-created_at', '-id'),
+}
+DEFAULT_PRODUCT_SORT = 'featured'
+
+
+class ProductQuerySet(models.QuerySet):
+    def in_stock(self):
+        return self.filter(stock__gt=0)  # Exclude out-of-stock products
+
+    def with_available_stock(self):
+        """Annotate ``available_stock``: stock minus quantities held by active reservations."""
+        return self.annotate(available_stock=F('stock') - StockReservation.held_quantity(OuterRef('pk')))
+
+    def available(self):
+        # The plain stock filter stays first so it can use the stock indexes
+        return self.in_stock().with_available_stock().filter(available_stock__gt=0)
+
+    def featured(self):
+        # is_featured=True compiles to a bare column test on SQLite, which
+        # can't seek product_featured_idx; an IN list is an equality seek
+        return self.filter(is_featured__in=[True])
+
+    def sorted(self, sort):
+        return self.order_by(*PRODUCT_ORDERINGS.get(sort, PRODUCT_ORDERINGS[DEFAULT_PRODUCT_SORT]))
+
+    def for_catalog(self):
+        """Load everything ProductSerializer touches in a fixed number of queries."""
+        return self.select_related('category').prefetch_related('features', 'images')
+
+    def for_fields(self, fields=None):
+        """
+        Load only what the given ProductSerializer fields need.
+
+        Columns outside ``fields`` (and the current ordering, which keyset
+        pagination reads back) are deferred, and the category join and the
+        feature and image prefetches only happen when asked for; ``image``
+        prefetches just the first image of each product. ``None`` means every
+        default field, like ``for_catalog``.
+        """
+        if fields is None:
+            return self.for_catalog()
+        columns = {'id'}
+        concrete = {field.name for field in Product._meta.concrete_fields}
+        columns.update(field for field in fields if field in concrete)
+        columns.update(
+            expression.lstrip('-') for expression in self.query.order_by
+            if isinstance(expression, str) and expression.lstrip('-') in concrete
+        )
+
+        queryset = self
+        if 'category' in fields:
+            queryset = queryset.select_related('category')
+        if 'features' in fields:
+            queryset = queryset.prefetch_related('features')
+        if 'images' in fields:
+            queryset = queryset.prefetch_related('images')
+        elif 'image' in fields:
+            queryset = queryset.prefetch_related(
+                models.Prefetch('images', queryset=Image.objects.order_by('id')[:1], to_attr='first_images')
+            )
+        return queryset.only(*columns)
+
+
 class Product(models.Model):
     id = models.CharField(max_length=50, primary_key=True)
     name = models.CharField(max_length=200)
@@ -27,12 +110,38 @@ class Product(models.Model):
     reviews = models.IntegerField(default=0)
     is_featured = models.BooleanField(default=False)
     color = models.CharField(max_length=7)  # Store as hex color code
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = ProductQuerySet.as_manager()
+
+    class Meta:
+        # Listings only ever show in-stock products in one of the
+        # PRODUCT_ORDERINGS, so partial indexes on stock > 0 serve each
+        # ordering (and the per-category variants) straight from the index
+        # without a sort. The featured index also carries stock, making it
+        # covering for the pagination COUNT. Checked by check_query_plans.
+        indexes = [
+            models.Index(fields=['is_featured', 'id', 'stock'], condition=Q(stock__gt=0), name='product_featured_idx'),
+            models.Index(fields=['price', 'id'], condition=Q(stock__gt=0), name='product_price_idx'),
+            models.Index(fields=['rating', 'id'], condition=Q(stock__gt=0), name='product_rating_idx'),
+            models.Index(fields=['category', 'is_featured', 'id'], condition=Q(stock__gt=0),
+                         name='product_cat_featured_idx'),
+            models.Index(fields=['category', 'price', 'id'], condition=Q(stock__gt=0), name='product_cat_price_idx'),
+            models.Index(fields=['category', 'rating', 'id'], condition=Q(stock__gt=0), name='product_cat_rating_idx'),
+            models.Index(fields=['created_at', 'id'], condition=Q(stock__gt=0), name='product_newest_idx'),
+            models.Index(fields=['category', 'created_at', 'id'], condition=Q(stock__gt=0),
+                         name='product_cat_newest_idx'),
+            models.Index(fields=['updated_at'], name='product_updated_idx'),  # Change feed
+        ]
 
     def __str__(self):
         return self.name
 class Feature(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='features')
     text = models.CharField(max_length=255)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.text
@@ -42,10 +151,82 @@ class Image(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='images')
     url = models.URLField()
     alt_text = models.CharField(max_length=255, blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.url
 
+class CatalogTombstone(models.Model):
+    """Records a deleted product or category for the catalog change feed."""
+    KIND_PRODUCT = 'product'
+    KIND_CATEGORY = 'category'
+    KIND_CHOICES = [
+        (KIND_PRODUCT, 'Product'),
+        (KIND_CATEGORY, 'Category'),
+    ]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.CharField(max_length=50)
+    category_id = models.CharField(max_length=50, blank=True)  # A deleted product's category, for snapshot refreshes
+    deleted_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"{self.kind} {self.object_id} deleted at {self.deleted_at}"
+
+
+class ProductSnapshot(models.Model):
+    """The pre-encoded ProductSerializer JSON of one product."""
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='snapshot')
+    category_id = models.CharField(max_length=50)  # Category at build time, to find blobs to rebuild on moves
+    body = models.BinaryField()
+    built_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Snapshot of {self.product_id}"
+
+
+class CatalogSnapshot(models.Model):
+    """A pre-encoded JSON response body, served byte for byte by the snapshot endpoint."""
+    key = models.CharField(max_length=150, primary_key=True)
+    body = models.BinaryField()
+    etag = models.CharField(max_length=64)
+    built_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.key
+
+
+class StockReservation(models.Model):
+    """A temporary hold on stock for a cart that is going through checkout."""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reservations')
+    cart = models.CharField(max_length=64)  # Client-generated cart token
+    quantity = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['cart', 'product'], name='unique_cart_product_reservation'),
+        ]
+        indexes = [
+            models.Index(fields=['product', 'expires_at'], name='reservation_product_idx'),
+            models.Index(fields=['expires_at'], name='reservation_expiry_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_id} for cart {self.cart}"
+
+    @classmethod
+    def held_quantity(cls, product_ref, exclude_cart=None):
+        """Total quantity of a product held by unexpired reservations, as a subquery expression."""
+        holds = cls.objects.filter(product=product_ref, expires_at__gt=Now())
+        if exclude_cart:
+            holds = holds.exclude(cart=exclude_cart)
+        total = holds.order_by().values('product').annotate(total=Sum('quantity')).values('total')
+        return Coalesce(Subquery(total), 0)
+
+
 class Contact(models.Model):
     name = models.CharField(max_length=100)
     email = models.EmailField()
@@ -57,6 +238,7 @@ class Contact(models.Model):
         return f"{self.name} - {self.subject}"
 
     def send_acknowledgment_email(self):
+        """Queue the acknowledgment email; the outbox worker delivers it."""
         subject = "Thank you for contacting store support!"
         message = f"""
         Hi {self.name},
@@ -70,20 +252,16 @@ class Contact(models.Model):
         Best regards,
         Philip
         """
-        html_message = render_to_string('emails/contact_acknowledgment_email.html', {
-            'name': self.name,
-            'subject': self.subject,
-            'message': self.message,
-        })
-        send_mail(
+        with timed('template'):
+            html_message = render_to_string('emails/contact_acknowledgment_email.html', {
+                'name': self.name,
+                'subject': self.subject,
+                'message': self.message,
+            })
+        OutboundEmail.queue(
             subject,
-            '',
-            settings.DEFAULT_FROM_EMAIL,
             [self.email],
-            fail_silently=False,
-            html_message=html_message,
-
-
+            html_body=html_message,
         )
 
 class Newsletter(models.Model):
@@ -109,4 +287,89 @@ class Order(models.Model):
     status = models.CharField(max_length=20, default='pending')
 
     def __str__(self):
-        return f"Order by {self.customer_name} - {self.platform}"
\ No newline at end of file
+        return f"Order by {self.customer_name} - {self.platform}"
+
+
+class OrderDailyRollup(models.Model):
+    """Order count and revenue per day, platform and status (see rollups.py)."""
+    day = models.DateField()
+    platform = models.CharField(max_length=10)
+    status = models.CharField(max_length=20)
+    orders = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'platform', 'status'], name='order_rollup_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.platform} {self.status}: {self.orders} orders"
+
+
+class ProductDailyRollup(models.Model):
+    """Units sold and revenue per day, product and order status (see rollups.py)."""
+    day = models.DateField()
+    product_id = models.CharField(max_length=50)  # Not a foreign key: sales outlive deleted products
+    status = models.CharField(max_length=20)
+    quantity = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'product_id', 'status'], name='product_rollup_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.product_id} {self.status}: {self.quantity} sold"
+
+
+class OutboundEmail(models.Model):
+    """
+    An email waiting to be delivered by the ``process_outbox`` worker.
+
+    Requests only insert a row here, in the same transaction as the data the
+    email is about, so SMTP latency and failures never reach the client.
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_SENDING = 'sending'
+    STATUS_SENT = 'sent'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_SENDING, 'Sending'),
+        (STATUS_SENT, 'Sent'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField(blank=True)
+    html_body = models.TextField(blank=True)
+    from_email = models.CharField(max_length=254, blank=True)
+    to = models.JSONField()  # List of recipient addresses
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    claimed_at = models.DateTimeField(blank=True, null=True)
+    claimed_by = models.CharField(max_length=32, blank=True)  # Token of the worker batch holding the row
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} -> {', '.join(self.to)} ({self.status})"
+
+    @classmethod
+    def queue(cls, subject, to, body='', html_body='', from_email=None):
+        return cls.objects.create(
+            subject=subject,
+            body=body,
+            html_body=html_body,
+            from_email=from_email or settings.DEFAULT_FROM_EMAIL or '',
+            to=list(to),
+        )
@@ -0,0 +1,135 @@
+"""
+Delivery side of the outbound email outbox.
+
+Workers claim a batch of due rows with a conditional UPDATE (so concurrent
+workers never send the same email twice), deliver the whole batch over a
+single SMTP connection and record the outcome of every message. Failed
+messages are retried with exponential backoff until ``max_attempts``.
+"""
+import uuid
+from datetime import timedelta
+
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import OutboundEmail
+
+BATCH_SIZE = 50
+MAX_ATTEMPTS = 6
+RETRY_BASE_DELAY = timedelta(minutes=1)
+RETRY_MAX_DELAY = timedelta(hours=1)
+
+# A claim older than this is assumed to belong to a crashed worker
+CLAIM_TIMEOUT = timedelta(minutes=10)
+
+
+def retry_delay(attempts):
+    return min(RETRY_BASE_DELAY * (2 ** max(attempts - 1, 0)), RETRY_MAX_DELAY)
+
+
+def _due_filter(now):
+    return (
+        Q(status=OutboundEmail.STATUS_PENDING, next_attempt_at__lte=now)
+        | Q(status=OutboundEmail.STATUS_SENDING, claimed_at__lt=now - CLAIM_TIMEOUT)
+    )
+
+
+def claim_batch(batch_size=BATCH_SIZE):
+    """Mark up to ``batch_size`` due emails as being sent by this worker and return them."""
+    now = timezone.now()
+    token = uuid.uuid4().hex
+    candidate_ids = list(
+        OutboundEmail.objects.filter(_due_filter(now))
+        .order_by('next_attempt_at', 'id')
+        .values_list('id', flat=True)[:batch_size]
+    )
+    if not candidate_ids:
+        return []
+    # Re-check the due condition in the UPDATE itself so rows another worker
+    # claimed in the meantime are left alone
+    OutboundEmail.objects.filter(_due_filter(now), id__in=candidate_ids).update(
+        status=OutboundEmail.STATUS_SENDING,
+        claimed_at=now,
+        claimed_by=token,
+    )
+    return list(OutboundEmail.objects.filter(claimed_by=token, status=OutboundEmail.STATUS_SENDING).order_by('id'))
+
+
+def build_message(email, connection):
+    message = EmailMultiAlternatives(
+        subject=email.subject,
+        body=email.body,
+        from_email=email.from_email or None,
+        to=email.to,
+        connection=connection,
+    )
+    if email.html_body:
+        message.attach_alternative(email.html_body, 'text/html')
+    return message
+
+
+def deliver_batch(emails, max_attempts=MAX_ATTEMPTS):
+    """Send ``emails`` over one connection. Returns ``(sent, failed)`` counts."""
+    if not emails:
+        return 0, 0
+
+    connection = get_connection(fail_silently=False)
+    sent_ids = []
+    failures = []
+    try:
+        connection.open()
+    except Exception as exc:
+        failures = [(email, exc) for email in emails]
+    else:
+        try:
+            for email in emails:
+                try:
+                    build_message(email, connection).send()
+                except Exception as exc:
+                    failures.append((email, exc))
+                else:
+                    sent_ids.append(email.id)
+        finally:
+            connection.close()
+
+    now = timezone.now()
+    if sent_ids:
+        OutboundEmail.objects.filter(id__in=sent_ids).update(
+            status=OutboundEmail.STATUS_SENT,
+            attempts=F('attempts') + 1,
+            sent_at=now,
+            claimed_by='',
+            last_error='',
+        )
+
+    for email, exc in failures:
+        email.attempts += 1
+        email.last_error = f'{type(exc).__name__}: {exc}'
+        email.claimed_by = ''
+        if email.attempts >= max_attempts:
+            email.status = OutboundEmail.STATUS_FAILED
+        else:
+            email.status = OutboundEmail.STATUS_PENDING
+            email.next_attempt_at = now + retry_delay(email.attempts)
+    if failures:
+        OutboundEmail.objects.bulk_update(
+            [email for email, _ in failures],
+            ['attempts', 'last_error', 'claimed_by', 'status', 'next_attempt_at'],
+        )
+
+    return len(sent_ids), len(failures)
+
+
+def process_outbox(batch_size=BATCH_SIZE, max_attempts=MAX_ATTEMPTS, max_batches=None):
+    """Deliver due emails batch by batch until none are left. Returns ``(sent, failed)``."""
+    total_sent = total_failed = batches = 0
+    while max_batches is None or batches < max_batches:
+        emails = claim_batch(batch_size)
+        if not emails:
+            break
+        sent, failed = deliver_batch(emails, max_attempts=max_attempts)
+        total_sent += sent
+        total_failed += failed
+        batches += 1
+    return total_sent, total_failed
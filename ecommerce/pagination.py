@@ -0,0 +1,160 @@
+import base64
+import json
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import connection
+from django.db.models import BooleanField, Q
+from django.db.models.expressions import RawSQL
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class ProductPagination(PageNumberPagination):
+    page_size = 10  # Number of products per page
+    page_size_query_param = 'page_size'  # Allow the client to specify the page size
+    max_page_size = 100  # Maximum number of products per page
+
+
+class ProductCursorPagination(BasePagination):
+    """
+    Keyset pagination for infinite-scroll clients.
+
+    The cursor encodes the sort values of the last row on the page, and the
+    next page is fetched with a ``WHERE (sort columns) > (cursor)`` condition
+    instead of an OFFSET. Deep pages cost the same as the first one and there
+    is no ``COUNT(*)``. The queryset ordering must end with a unique column
+    (``id``) so that rows with equal sort values are never skipped or repeated.
+    """
+    cursor_query_param = 'cursor'
+    page_size = ProductPagination.page_size
+    page_size_query_param = ProductPagination.page_size_query_param
+    max_page_size = ProductPagination.max_page_size
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.next_values = None
+
+        # Search results are already cut down to a handful of ranked rows
+        if queryset.query.is_sliced:
+            return list(queryset)
+
+        self.ordering = self.get_ordering(queryset)
+        self.model = queryset.model
+        cursor = self.decode_cursor(request)
+        if cursor is not None:
+            queryset = queryset.filter(self.keyset_condition(cursor))
+
+        # Fetch one extra row to find out whether there is a next page
+        results = list(queryset[:self.page_size + 1])
+        page = results[:self.page_size]
+        if len(results) > self.page_size:
+            self.next_values = [self.cursor_value(page[-1], field) for field, _ in self.ordering]
+        return page
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_ordering(self, queryset):
+        """The queryset ordering as ``(field, descending)`` pairs."""
+        ordering = []
+        for expression in queryset.query.order_by:
+            if not isinstance(expression, str):
+                raise ValueError('Keyset pagination needs an ordering made of plain field names.')
+            ordering.append((expression.lstrip('-'), expression.startswith('-')))
+        if not ordering or ordering[-1][0] not in ('id', 'pk'):
+            raise ValueError('Keyset pagination needs an ordering that ends with the primary key.')
+        return ordering
+
+    def keyset_condition(self, values):
+        """Rows strictly after ``values`` in the current ordering."""
+        directions = {descending for _, descending in self.ordering}
+        if len(directions) == 1:
+            # Every column sorts the same way, so this is a single row-value
+            # comparison, (a, id) > (x, y), which the planner turns into an
+            # index seek straight to the cursor
+            return self.row_value_condition(values, descending=directions.pop())
+
+        condition = Q()
+        equal = {}
+        for (field, descending), value in zip(self.ordering, values):
+            lookup = 'lt' if descending else 'gt'
+            condition |= Q(**equal, **{f'{field}__{lookup}': value})
+            equal[field] = value
+        # The OR alone is not sargable; a range bound on the first sort column
+        # lets the planner seek into the index instead of walking it
+        first_field, descending = self.ordering[0]
+        return Q(**{f"{first_field}__{'lte' if descending else 'gte'}": values[0]}) & condition
+
+    def row_value_condition(self, values, descending):
+        fields = [self.get_model_field(field) for field, _ in self.ordering]
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        columns = ', '.join(f'{table}.{connection.ops.quote_name(field.column)}' for field in fields)
+        placeholders = ', '.join(['%s'] * len(fields))
+        params = [field.get_db_prep_value(value, connection) for field, value in zip(fields, values)]
+        operator = '<' if descending else '>'
+        return RawSQL(f'({columns}) {operator} ({placeholders})', params, output_field=BooleanField())
+
+    def cursor_value(self, obj, field):
+        value = obj[field] if isinstance(obj, dict) else getattr(obj, field)  # values() rows too
+        if isinstance(value, (bool, int, str)) or value is None:
+            return value
+        return str(value)  # Decimal and datetime values round-trip through their string form
+
+    def get_model_field(self, field):
+        return self.model._meta.pk if field == 'pk' else self.model._meta.get_field(field)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            values = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+        except (TypeError, ValueError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return [self.parse_cursor_value(field, value) for (field, _), value in zip(self.ordering, values)]
+
+    def parse_cursor_value(self, field, value):
+        """A cursor value as its sort field's Python type; anything that doesn't fit is an invalid cursor."""
+        if value is None:
+            raise NotFound(self.invalid_cursor_message)
+        model_field = self.get_model_field(field)
+        try:
+            return model_field.to_python(value)
+        except (DjangoValidationError, TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, values):
+        return base64.urlsafe_b64encode(json.dumps(values).encode('utf-8')).decode('ascii')
+
+    def get_next_link(self):
+        if self.next_values is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.next_values))
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
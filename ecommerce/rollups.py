@@ -0,0 +1,203 @@
+"""
+Materialized daily sales rollups.
+
+``OrderDailyRollup`` holds the order count and revenue per day, platform and
+status, and ``ProductDailyRollup`` the units sold and revenue per day,
+product and status. Saving or deleting an order applies its contribution as
+an increment in the same transaction (see ``signals.py``), so the analytics
+endpoint answers from a few rows per day however many orders there are.
+
+Bulk writes (``bulk_create``, ``QuerySet.update``) skip the signals; run
+``manage.py backfill_order_rollups`` after them.
+
+Line revenue is the line's ``price`` times its ``quantity``. Lines saved
+without a price get the product's price at that moment written into them
+(``price_lines``), so adding and later removing an order, and rebuilding,
+all count the same value; a line whose product is gone counts as zero.
+"""
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .models import Order, OrderDailyRollup, Product, ProductDailyRollup
+
+
+def order_day(created_at):
+    return timezone.localtime(created_at).date() if timezone.is_aware(created_at) else created_at.date()
+
+
+def _decimal(value):
+    try:
+        return Decimal(str(value))
+    except (InvalidOperation, TypeError, ValueError):
+        return None
+
+
+def order_state(order):
+    """The fields of an order the rollups depend on."""
+    return {
+        'day': order_day(order.created_at or timezone.now()),
+        'platform': order.platform,
+        'status': order.status,
+        'total': _decimal(order.total_amount) or Decimal('0'),
+        'items': order.order_details if isinstance(order.order_details, list) else [],
+    }
+
+
+def product_lines(items):
+    """``(product_id, quantity, revenue)`` for each valid line of an order."""
+    lines = []
+    for item in items:
+        if not isinstance(item, dict) or item.get('id') is None:
+            continue
+        quantity = item.get('quantity')
+        if not isinstance(quantity, int) or quantity <= 0:
+            continue
+        product_id = str(item['id'])
+        price = _decimal(item.get('price'))
+        lines.append((product_id, quantity, (price or Decimal('0')) * quantity))
+    return lines
+
+
+def missing_prices(items):
+    """Current prices of the products named in lines that carry no price of their own."""
+    product_ids = {
+        str(item['id']) for item in items
+        if isinstance(item, dict) and item.get('id') is not None and _decimal(item.get('price')) is None
+    }
+    if not product_ids:
+        return {}
+    return dict(Product.objects.filter(pk__in=product_ids).values_list('pk', 'price'))
+
+
+def price_lines(items):
+    """``items`` with the current product price filled into every line that has none."""
+    if not isinstance(items, list):
+        return items
+    prices = missing_prices(items)
+    return [
+        {**item, 'price': str(prices[str(item['id'])])}
+        if isinstance(item, dict) and _decimal(item.get('price')) is None and str(item.get('id')) in prices
+        else item
+        for item in items
+    ]
+
+
+def _increment(model, key, **deltas):
+    """Add ``deltas`` to the rollup row for ``key``, creating it if needed."""
+    updates = {field: F(field) + delta for field, delta in deltas.items()}
+    if model.objects.filter(**key).update(**updates):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**key, **deltas)
+    except IntegrityError:  # Created concurrently
+        model.objects.filter(**key).update(**updates)
+
+
+def apply(state, sign):
+    """Add (``sign=1``) or remove (``sign=-1``) one order's contribution."""
+    _increment(
+        OrderDailyRollup,
+        {'day': state['day'], 'platform': state['platform'], 'status': state['status']},
+        orders=sign, revenue=sign * state['total'],
+    )
+    per_product = defaultdict(lambda: [0, Decimal('0')])
+    for product_id, quantity, revenue in product_lines(state['items']):
+        per_product[product_id][0] += quantity
+        per_product[product_id][1] += revenue
+    for product_id, (quantity, revenue) in sorted(per_product.items()):
+        _increment(
+            ProductDailyRollup,
+            {'day': state['day'], 'product_id': product_id, 'status': state['status']},
+            quantity=sign * quantity, revenue=sign * revenue,
+        )
+
+
+def rebuild(chunk_size=2000):
+    """
+    Recompute every rollup from the orders table. Returns the number of orders read.
+
+    Orders are streamed in chunks; only the per-day totals are kept in memory.
+    """
+    orders = defaultdict(lambda: [0, Decimal('0')])
+    products = defaultdict(lambda: [0, Decimal('0')])
+    read = 0
+    rows = Order.objects.order_by().values_list(
+        'created_at', 'platform', 'status', 'total_amount', 'order_details'
+    ).iterator(chunk_size=chunk_size)
+
+    with transaction.atomic():
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                read += _add_chunk(chunk, orders, products)
+                chunk = []
+        read += _add_chunk(chunk, orders, products)
+
+        OrderDailyRollup.objects.all().delete()
+        ProductDailyRollup.objects.all().delete()
+        OrderDailyRollup.objects.bulk_create(
+            [OrderDailyRollup(day=day, platform=platform, status=status, orders=count, revenue=revenue)
+             for (day, platform, status), (count, revenue) in orders.items()],
+            batch_size=chunk_size,
+        )
+        ProductDailyRollup.objects.bulk_create(
+            [ProductDailyRollup(day=day, product_id=product_id, status=status, quantity=quantity, revenue=revenue)
+             for (day, product_id, status), (quantity, revenue) in products.items()],
+            batch_size=chunk_size,
+        )
+    return read
+
+
+def _add_chunk(chunk, orders, products):
+    for created_at, platform, status, total, details in chunk:
+        day = order_day(created_at)
+        totals = orders[(day, platform, status)]
+        totals[0] += 1
+        totals[1] += _decimal(total) or Decimal('0')
+        for product_id, quantity, revenue in product_lines(details if isinstance(details, list) else []):
+            totals = products[(day, product_id, status)]
+            totals[0] += quantity
+            totals[1] += revenue
+    return len(chunk)
+
+
+def _filter(queryset, since=None, until=None, statuses=None):
+    if since:
+        queryset = queryset.filter(day__gte=since)
+    if until:
+        queryset = queryset.filter(day__lte=until)
+    if statuses:
+        queryset = queryset.filter(status__in=statuses)
+    return queryset
+
+
+def revenue_by_day(**filters):
+    return list(
+        _filter(OrderDailyRollup.objects.all(), **filters)
+        .values('day').annotate(orders=Sum('orders'), revenue=Sum('revenue')).order_by('day')
+    )
+
+
+def revenue_by_platform(**filters):
+    return list(
+        _filter(OrderDailyRollup.objects.all(), **filters)
+        .values('platform').annotate(orders=Sum('orders'), revenue=Sum('revenue')).order_by('-revenue', 'platform')
+    )
+
+
+def top_products(limit=10, **filters):
+    rows = list(
+        _filter(ProductDailyRollup.objects.all(), **filters)
+        .values('product_id').annotate(quantity=Sum('quantity'), revenue=Sum('revenue'))
+        .order_by('-revenue', 'product_id')[:limit]
+    )
+    names = dict(Product.objects.filter(pk__in=[row['product_id'] for row in rows]).values_list('pk', 'name'))
+    for row in rows:
+        row['name'] = names.get(row['product_id'])
+    return rows
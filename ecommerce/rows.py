@@ -0,0 +1,115 @@
+"""
+Read-only product serialization straight from ``values()`` rows.
+
+``ProductSerializer`` walks its fields one by one for every product and
+builds a model instance, a nested category serializer and a serializer per
+feature and image. For list pages that is more work than the SQL. A
+``ProductRows`` is compiled once for a set of fields and turns ``values()``
+dicts plus ``(product_id, ...)`` tuples for the children into exactly the
+JSON ``ProductSerializer(fields=...)`` produces, without instantiating
+models. ``ecommerce/tests.py`` checks that the two outputs are identical.
+"""
+import decimal
+
+from django.db import models
+
+from .instrumentation import timed
+from .models import Category, Feature, Image, Product
+from .serializers import CategorySerializer, ProductSerializer
+
+
+def _formatter(model_field):
+    """
+    Turn a column value into what the ModelSerializer field for it returns,
+    or ``None`` when the value is already right.
+    """
+    if isinstance(model_field, models.DecimalField):
+        # DRF's DecimalField with COERCE_DECIMAL_TO_STRING
+        exponent = decimal.Decimal('.1') ** model_field.decimal_places
+        context = decimal.getcontext().copy()
+        context.prec = model_field.max_digits
+        return lambda value: '{:f}'.format(value.quantize(exponent, context=context))
+    if isinstance(model_field, (models.IntegerField, models.BooleanField)):
+        return None
+    return str
+
+
+def _build(row, columns):
+    return {
+        name: row[key] if format_value is None or row[key] is None else format_value(row[key])
+        for name, key, format_value in columns
+    }
+
+
+class ProductRows:
+    """Compiled ``ProductSerializer`` output for one set of fields."""
+
+    def __init__(self, fields=None, sideload_categories=False):
+        wanted = set(fields if fields is not None else ProductSerializer.default_fields())
+        self.fields = [name for name in ProductSerializer.Meta.fields if name in wanted]
+        self.sideload_categories = sideload_categories
+        if sideload_categories:
+            # Rows carry category_id; the categories go in the response once (see sideload.py)
+            if 'category' not in wanted:
+                self.fields.append('category')
+            self.fields = ['category_id' if name == 'category' else name for name in self.fields]
+            wanted = (wanted - {'category'}) | {'category_id'}
+
+        # (output name, values() key, formatter) for the product's own
+        # columns and for the nested category
+        self.columns = [
+            (name, name, _formatter(Product._meta.get_field(name)))
+            for name in self.fields
+            if name != 'category' and name in {field.name for field in Product._meta.concrete_fields}
+        ]
+        if sideload_categories:
+            self.columns.append(('category_id', 'category_id', _formatter(Category._meta.pk)))
+        self.category_columns = [
+            (name, f'category__{name}', _formatter(Category._meta.get_field(name)))
+            for name in CategorySerializer.default_fields()
+        ] if 'category' in wanted else []
+
+    def values(self, queryset, extra=()):
+        """``queryset`` as the ``values()`` rows this serializer needs, plus the ``extra`` columns."""
+        keys = {'id', *extra}
+        keys.update(key for _, key, _ in self.columns + self.category_columns)
+        # Deferred loading and prefetches are for model instances only
+        return queryset.select_related(None).prefetch_related(None).values(*sorted(keys))
+
+    def children(self, product_ids):
+        """Feature and image dicts for the given products, grouped by product id."""
+        features, images = {}, {}
+        if 'features' in self.fields:
+            for product_id, text in Feature.objects.filter(product_id__in=product_ids).values_list('product_id', 'text'):
+                features.setdefault(product_id, []).append({'text': text})
+        if 'images' in self.fields or 'image' in self.fields:
+            image_rows = Image.objects.filter(product_id__in=product_ids)
+            if 'images' not in self.fields:
+                # Only the first image is shown, so only the first is read
+                first_ids = image_rows.order_by().values('product_id').annotate(first_id=models.Min('id')).values('first_id')
+                image_rows = Image.objects.filter(id__in=first_ids)
+            for product_id, url, alt_text in image_rows.values_list('product_id', 'url', 'alt_text'):
+                images.setdefault(product_id, []).append({'url': url, 'alt_text': alt_text})
+        return features, images
+
+    def serialize(self, rows):
+        """The serialized products for a list of ``values()`` rows, in order."""
+        features, images = self.children([row['id'] for row in rows]) if rows else ({}, {})
+        with timed('serialize'):
+            return [self.serialize_row(row, features, images) for row in rows]
+
+    def serialize_row(self, row, features, images):
+        own = _build(row, self.columns)
+        data = {}
+        for name in self.fields:
+            if name == 'category':
+                data[name] = _build(row, self.category_columns)
+            elif name == 'features':
+                data[name] = features.get(row['id'], [])
+            elif name == 'images':
+                data[name] = images.get(row['id'], [])
+            elif name == 'image':
+                data[name] = images[row['id']][0] if row['id'] in images else None
+            else:
+                data[name] = own[name]
+        return data
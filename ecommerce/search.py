@@ -0,0 +1,192 @@
+"""
+Full-text product search backed by an SQLite FTS5 shadow index.
+
+The index holds one document per product (name, description and the text of
+its features) and is kept in sync by the handlers in ``signals.py``. Each
+document's rowid is derived from its product id (``document_rowid``), so
+replacing or dropping a document is a rowid lookup rather than a scan of the
+index's unindexed ``product_id`` column. Bulk writes that bypass signals
+should call ``index_products`` or ``rebuild_index`` afterwards.
+
+On databases other than SQLite every function degrades to a no-op and
+``search_products`` falls back to ``icontains`` filtering; ``is_available``
+tells callers whether ``top_ranked`` can be used.
+"""
+import hashlib
+import re
+
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, When
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = 'ecommerce_product_fts'
+
+# How many matches are read in relevance order. Only relevance-ranked pages
+# use this list; filtering, sorting and facet counts use every match.
+SEARCH_CANDIDATE_LIMIT = 500
+
+# Column weights for bm25(): product_id (unindexed), name, description, features
+BM25_WEIGHTS = (0.0, 10.0, 1.0, 4.0)
+
+# SQLite's default limit on bound parameters is 999 on older builds
+_CHUNK_SIZE = 500
+
+_DOCUMENT_SELECT = """
+    SELECT p.id, p.name, p.description, COALESCE(GROUP_CONCAT(f.text, ' '), '')
+    FROM ecommerce_product p
+    LEFT JOIN ecommerce_feature f ON f.product_id = p.id
+"""
+
+
+def is_available():
+    return connection.vendor == 'sqlite'
+
+
+def _chunks(values):
+    values = list(values)
+    for start in range(0, len(values), _CHUNK_SIZE):
+        yield values[start:start + _CHUNK_SIZE]
+
+
+def document_rowid(product_id):
+    """
+    The index rowid of a product's document: 63 bits of a hash of its id.
+
+    Product ids are strings, and the table's own rowids can be renumbered by
+    VACUUM, so neither can key the index.
+    """
+    digest = hashlib.blake2b(str(product_id).encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') >> 1
+
+
+def remove_products(product_ids):
+    """Drop the index documents of the given products."""
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        for chunk in _chunks(product_ids):
+            placeholders = ', '.join(['%s'] * len(chunk))
+            cursor.execute(
+                f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})",
+                [document_rowid(product_id) for product_id in chunk],
+            )
+
+
+def _insert_documents(cursor, documents):
+    cursor.executemany(
+        f"INSERT INTO {FTS_TABLE} (rowid, product_id, name, description, features) VALUES (%s, %s, %s, %s, %s)",
+        [(document_rowid(document[0]), *document) for document in documents],
+    )
+
+
+def index_products(product_ids):
+    """(Re)build the index documents of the given products straight from SQL."""
+    if not is_available():
+        return
+    remove_products(product_ids)
+    with connection.cursor() as cursor:
+        for chunk in _chunks(product_ids):
+            placeholders = ', '.join(['%s'] * len(chunk))
+            cursor.execute(f"{_DOCUMENT_SELECT} WHERE p.id IN ({placeholders}) GROUP BY p.id", chunk)
+            _insert_documents(cursor, cursor.fetchall())
+
+
+def rebuild_index(batch_size=2000):
+    """Recreate every index document. Returns the number of indexed products."""
+    if not is_available():
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        cursor.execute(f"{_DOCUMENT_SELECT} GROUP BY p.id")
+        # A second cursor writes while the first one streams the documents
+        with connection.cursor() as writer:
+            while True:
+                documents = cursor.fetchmany(batch_size)
+                if not documents:
+                    break
+                _insert_documents(writer, documents)
+        cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')")
+        cursor.execute(f"SELECT COUNT(*) FROM {FTS_TABLE}")
+        return cursor.fetchone()[0]
+
+
+def build_match_expression(query):
+    """Turn free text into an FTS5 query where every term is a quoted prefix match."""
+    terms = re.findall(r'\w+', query.lower())
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def ranked_product_ids(query, limit=SEARCH_CANDIDATE_LIMIT):
+    """
+    Return product ids matching ``query``, best BM25 score first.
+
+    Returns ``None`` when the index is not available on this database.
+    """
+    if not is_available():
+        return None
+    expression = build_match_expression(query)
+    if not expression:
+        return []
+    weights = ', '.join(str(weight) for weight in BM25_WEIGHTS)
+    sql = (
+        f"SELECT product_id FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s "
+        f"ORDER BY bm25({FTS_TABLE}, {weights})"
+    )
+    params = [expression]
+    if limit is not None:
+        sql += " LIMIT %s"
+        params.append(limit)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def rank_ordering(product_ids):
+    """An ORDER BY expression that keeps rows in the given ranked order."""
+    return Case(
+        *[When(pk=product_id, then=position) for position, product_id in enumerate(product_ids)],
+        default=len(product_ids),
+        output_field=IntegerField(),
+    )
+
+
+def match_subquery(expression):
+    """Every product id matching an FTS expression, as a subquery against the index."""
+    return RawSQL(f"SELECT product_id FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [expression])
+
+
+def search_products(queryset, query):
+    """
+    Narrow ``queryset`` to every product matching ``query``, in no particular order.
+
+    Uses the index where it is available and ``icontains`` filtering otherwise.
+    Listings that sort the matches and facet counts use this; relevance pages
+    use ``top_ranked``.
+    """
+    if not is_available():
+        return queryset.filter(Q(name__icontains=query) | Q(description__icontains=query))
+    expression = build_match_expression(query)
+    if not expression:
+        return queryset.none()
+    return queryset.filter(pk__in=match_subquery(expression))
+
+
+def top_ranked(queryset, query, limit):
+    """
+    The best ``limit`` rows of ``queryset`` matching ``query``, in relevance order.
+
+    Only the top ``SEARCH_CANDIDATE_LIMIT`` matches are ranked, and the ones
+    that pass the filters of ``queryset`` are picked out in SQL by id.
+    Matches beyond the candidates score lower than all of them; only when the
+    filters leave fewer than ``limit`` candidates is the full match set read,
+    in id order, to fill the rest.
+    """
+    ranked_ids = ranked_product_ids(query)
+    if not ranked_ids:
+        return queryset.none()
+    surviving = set(queryset.filter(pk__in=ranked_ids).values_list('pk', flat=True))
+    top_ids = [product_id for product_id in ranked_ids if product_id in surviving][:limit]
+    if len(top_ids) < limit and len(ranked_ids) >= SEARCH_CANDIDATE_LIMIT:
+        rest = queryset.filter(pk__in=match_subquery(build_match_expression(query))).exclude(pk__in=ranked_ids)
+        top_ids += list(rest.order_by('pk').values_list('pk', flat=True)[:limit - len(top_ids)])
+    return queryset.filter(pk__in=top_ids).order_by(rank_ordering(top_ids))
@@ -1,44 +1,91 @@
 from rest_framework import serializers
 from .models import Category, Product, Contact, Newsletter, Order
 from .models import *
-class CategorySerializer(serializers.ModelSerializer):
+from .instrumentation import TimedSerializerMixin
+
+
+class DynamicFieldsMixin:
+    """
+    Serialize only the fields named in the ``fields`` argument.
+
+    Fields listed in ``Meta.optional_fields`` are left out unless they are
+    asked for, so ``fields=None`` gives the serializer's usual output.
+    """
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        keep = set(fields) if fields is not None else set(self.default_fields())
+        for name in set(self.fields) - keep:
+            self.fields.pop(name)
+
+    @classmethod
+    def default_fields(cls):
+        optional = getattr(cls.Meta, 'optional_fields', ())
+        return [name for name in cls.Meta.fields if name not in optional]
+
+
+class CategorySerializer(DynamicFieldsMixin, TimedSerializerMixin, serializers.ModelSerializer):
+    product_count = serializers.IntegerField(read_only=True)
+
     class Meta:
         model = Category
-        fields = ['id', 'name', 'icon', 'description', 'slug']
+        fields = ['id', 'name', 'icon', 'description', 'slug', 'product_count']
+        optional_fields = ['product_count']  # Annotated by the view when requested
 
-class FeatureSerializer(serializers.ModelSerializer):
+class FeatureSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Feature
         fields = ['text']
 
 
-class ImageSerializer(serializers.ModelSerializer):
+class ImageSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Image
         fields = ['url', 'alt_text']
 
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(DynamicFieldsMixin, TimedSerializerMixin, serializers.ModelSerializer):
     category = CategorySerializer(read_only=True)
     features = FeatureSerializer(many=True, read_only=True)
     images = ImageSerializer(many=True, read_only=True)
+    image = serializers.SerializerMethodField()
 
     class Meta:
         model = Product
         fields = ['id', 'name', 'price', 'description', 'features', 'images', 
-                  'category', 'stock', 'rating', 'reviews', 'is_featured', 'color']
-class ContactSerializer(serializers.ModelSerializer):
+                  'category', 'stock', 'rating', 'reviews', 'is_featured', 'color', 'image']
+        optional_fields = ['image']  # The first image only, for product grids
+
+    def get_image(self, obj):
+        first_images = getattr(obj, 'first_images', None)
+        if first_images is None:
+            first_images = obj.images.all()[:1]
+        return ImageSerializer(first_images[0]).data if first_images else None
+
+
+# What the product grid shows; list responses default to this lean shape
+PRODUCT_LIST_FIELDS = ('id', 'name', 'price', 'rating', 'image')
+
+# Every product shape the API serves by default, plus everything at once
+PRODUCT_FIELD_SETS = {
+    'list': list(PRODUCT_LIST_FIELDS),
+    'detail': ProductSerializer.default_fields(),
+    'all': list(ProductSerializer.Meta.fields),
+}
+
+
+class ContactSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Contact
         fields = ['id', 'name', 'email', 'subject', 'message', 'created_at']
         read_only_fields = ['created_at']
 
-class NewsletterSerializer(serializers.ModelSerializer):
+class NewsletterSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Newsletter
         fields = '__all__'
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Order
         fields = '__all__'
\ No newline at end of file
@@ -0,0 +1,64 @@
+"""
+Side-loaded (normalized) category data for product lists.
+
+With ``?sideload=categories`` product rows carry a ``category_id`` instead
+of a full copy of their category, and the response gets an
+``included.categories`` map holding each referenced category once. The
+serialized categories come from a per-process cache that is rebuilt only
+when a category is added, edited or deleted, so a list request costs one
+aggregate query instead of serializing the categories again. Product and
+stock changes leave the cache alone.
+"""
+import threading
+
+from rest_framework.exceptions import ValidationError
+
+from django.db.models import Count, Max
+
+from .models import Category
+from .serializers import CategorySerializer
+
+SIDELOADABLE = ('categories',)
+
+_lock = threading.Lock()
+_categories = (None, {})  # (categories state, categories by id), replaced as a whole
+
+
+def parse_sideload(request):
+    """The relations named in ``?sideload=``; unknown names are a 400."""
+    value = request.query_params.get('sideload', '')
+    names = {name.strip() for name in value.split(',') if name.strip()}
+    unknown = names - set(SIDELOADABLE)
+    if unknown:
+        raise ValidationError({'sideload': f"Unknown relations: {', '.join(sorted(unknown))}"})
+    return names
+
+
+def cached_categories():
+    """Every category as ``CategorySerializer`` data, keyed by id."""
+    global _categories
+    state = categories_state()
+    if _categories[0] != state:
+        with _lock:
+            if _categories[0] != state:
+                categories = CategorySerializer(Category.objects.all(), many=True).data
+                _categories = (state, {category['id']: dict(category) for category in categories})
+    return _categories[1]
+
+
+def categories_state():
+    """Changes whenever a category is created, saved or deleted."""
+    state = Category.objects.aggregate(updated_at=Max('updated_at'), count=Count('id'))
+    return state['updated_at'], state['count']
+
+
+def included_categories(products):
+    """The ``included.categories`` map for serialized products that carry ``category_id``."""
+    categories = cached_categories()
+    category_ids = sorted({product['category_id'] for product in products})
+    missing = [category_id for category_id in category_ids if category_id not in categories]
+    if missing:
+        # Created after the cache was checked; fetch them rather than leave them out
+        fetched = CategorySerializer(Category.objects.filter(pk__in=missing), many=True).data
+        categories = {**categories, **{category['id']: dict(category) for category in fetched}}
+    return {category_id: categories[category_id] for category_id in category_ids if category_id in categories}
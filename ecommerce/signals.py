@@ -0,0 +1,187 @@
+import threading
+from contextlib import contextmanager
+from functools import wraps
+
+from django.db import transaction
+from django.db.models.functions import Now
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import rollups, search, snapshots
+from .cache import bump_catalog_version
+from .models import CatalogTombstone, Category, Feature, Image, Order, Product
+
+
+def catalog_bulk_changed(product_ids=(), category_ids=()):
+    """
+    Bring derived catalog data up to date after bulk writes.
+
+    ``bulk_create``/``bulk_update``/``update()`` do not send model signals,
+    so commands that use them call this with the products and categories
+    they touched.
+    """
+    product_ids = list(product_ids)
+    category_ids = list(category_ids)
+    if not product_ids and not category_ids:
+        return
+    if product_ids:
+        search.index_products(product_ids)
+        # Feature and image rows written in bulk change the product as the
+        # change feed sees it
+        Product.objects.filter(pk__in=product_ids).update(updated_at=Now())
+    snapshots.schedule_refresh(product_ids=product_ids, changed_category_ids=category_ids)
+    transaction.on_commit(bump_catalog_version)
+
+
+_bulk = threading.local()
+
+
+@contextmanager
+def bulk_child_writes():
+    """
+    Skip the per-row feature and image handlers inside the block.
+
+    ``QuerySet.delete()`` still sends a signal for every row it removes; a
+    command that replaces child rows in bulk wraps the delete in this and
+    calls ``catalog_bulk_changed`` once for all the products it touched.
+    """
+    previous = getattr(_bulk, 'active', False)
+    _bulk.active = True
+    try:
+        yield
+    finally:
+        _bulk.active = previous
+
+
+def per_row(handler):
+    @wraps(handler)
+    def wrapper(sender, **kwargs):
+        if getattr(_bulk, 'active', False) and sender in (Feature, Image):
+            return
+        return handler(sender, **kwargs)
+    return wrapper
+
+
+@receiver(post_save, sender=Product)
+def reindex_saved_product(sender, instance, raw=False, **kwargs):
+    if raw:  # Fixture loading, the related rows may not exist yet
+        return
+    search.index_products([instance.pk])
+
+
+@receiver(post_delete, sender=Product)
+def unindex_deleted_product(sender, instance, **kwargs):
+    search.remove_products([instance.pk])
+
+
+@receiver(post_save, sender=Feature)
+@receiver(post_delete, sender=Feature)
+@per_row
+def reindex_feature_product(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    search.index_products([instance.product_id])
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Feature)
+@receiver(post_delete, sender=Feature)
+@receiver(post_save, sender=Image)
+@receiver(post_delete, sender=Image)
+@per_row
+def invalidate_catalog_cache(sender, **kwargs):
+    # Bump after commit so no request can cache pre-commit data under the new version
+    transaction.on_commit(bump_catalog_version)
+
+
+@receiver(post_save, sender=Product)
+def refresh_saved_product_snapshot(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    snapshots.schedule_refresh(product_ids=[instance.pk], category_ids=[instance.category_id])
+
+
+@receiver(post_delete, sender=Product)
+def refresh_deleted_product_snapshot(sender, instance, **kwargs):
+    snapshots.schedule_refresh(category_ids=[instance.category_id])
+
+
+@receiver(post_save, sender=Feature)
+@receiver(post_delete, sender=Feature)
+@receiver(post_save, sender=Image)
+@receiver(post_delete, sender=Image)
+@per_row
+def refresh_child_product_snapshot(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    snapshots.schedule_refresh(product_ids=[instance.product_id])
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def refresh_category_snapshot(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    snapshots.schedule_refresh(changed_category_ids=[instance.pk])
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Category)
+def record_catalog_tombstone(sender, instance, **kwargs):
+    if sender is Product:
+        CatalogTombstone.objects.create(
+            kind=CatalogTombstone.KIND_PRODUCT, object_id=instance.pk, category_id=instance.category_id
+        )
+    else:
+        CatalogTombstone.objects.create(kind=CatalogTombstone.KIND_CATEGORY, object_id=instance.pk)
+
+
+@receiver(post_save, sender=Feature)
+@receiver(post_delete, sender=Feature)
+@receiver(post_save, sender=Image)
+@receiver(post_delete, sender=Image)
+@per_row
+def touch_child_product(sender, instance, raw=False, origin=None, **kwargs):
+    """Features and images are part of the product in the change feed."""
+    if raw:
+        return
+    if isinstance(origin, (Product, Category)) or getattr(origin, 'model', None) in (Product, Category):
+        return  # The product itself is being deleted
+    Product.objects.filter(pk=instance.product_id).update(updated_at=Now())
+
+
+@receiver(pre_save, sender=Order)
+def remember_order_rollup_state(sender, instance, raw=False, **kwargs):
+    """Keep what an existing order contributed to the rollups, to take it back out after the save."""
+    instance._rollup_state = None
+    if raw:
+        return
+    # The rollups value a line at its own price, which must not move later
+    instance.order_details = rollups.price_lines(instance.order_details)
+    if instance.pk is None:
+        return
+    previous = Order.objects.filter(pk=instance.pk).first()
+    if previous is not None:
+        instance._rollup_state = rollups.order_state(previous)
+
+
+@receiver(post_save, sender=Order)
+def update_order_rollups(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_rollup_state', None)
+    current = rollups.order_state(instance)
+    if previous == current:
+        return  # Nothing the rollups count has changed
+    with transaction.atomic():
+        if previous is not None:
+            rollups.apply(previous, -1)
+        rollups.apply(current, 1)
+
+
+@receiver(post_delete, sender=Order)
+def remove_order_from_rollups(sender, instance, **kwargs):
+    rollups.apply(rollups.order_state(instance), -1)
@@ -0,0 +1,257 @@
+"""
+Precomputed catalog snapshots.
+
+Every product's ``ProductSerializer`` output is rendered to JSON once and
+stored in ``ProductSnapshot``. Per-category listings for every sort order
+are then assembled by joining those fragments in listing order and stored as
+``CatalogSnapshot`` blobs, which the snapshot endpoint serves without
+touching a serializer. The category list gets a blob of its own.
+
+When a few products change only their fragments are re-rendered and only
+the blobs of the categories they belong to (or left) are reassembled.
+Refreshing is kept off the request path: ``build_catalog_snapshot --stale``
+finds changed rows by their timestamps and deleted ones by their tombstones,
+and ``CATALOG_SNAPSHOT_AUTO_REFRESH`` (off by default) refreshes after each
+admin or import write instead.
+"""
+import hashlib
+import threading
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef, Q
+from rest_framework.renderers import JSONRenderer
+
+from .models import (
+    DEFAULT_PRODUCT_SORT, PRODUCT_ORDERINGS, CatalogSnapshot, CatalogTombstone, Category, Feature, Image, Product,
+    ProductSnapshot,
+)
+from .serializers import CategorySerializer, ProductSerializer
+
+# Sort orders a blob is built for
+SNAPSHOT_SORTS = ('featured', 'price-low-high', 'price-high-low', 'rating', 'newest')
+
+CATEGORIES_KEY = 'categories'
+
+_renderer = JSONRenderer()
+
+
+def category_key(category_id, sort):
+    return f'products:{category_id}:{sort}'
+
+
+def _etag(body):
+    return hashlib.sha1(body).hexdigest()
+
+
+def _sort_fragments(rows, sort):
+    """
+    ``rows`` (dicts of the sort columns plus ``body``) in the live listing's
+    ordering for ``sort``: stable sorts applied from the last field to the
+    first, the same order SQL's ORDER BY gives.
+    """
+    rows = list(rows)
+    for field in reversed(PRODUCT_ORDERINGS[sort]):
+        name = field.lstrip('-')
+        rows.sort(key=lambda row: row[name], reverse=field.startswith('-'))
+    return rows
+
+
+def _store(key, body):
+    # A single upsert statement: update_or_create reads before writing, which
+    # on SQLite makes concurrent refreshes fail with "database is locked"
+    CatalogSnapshot.objects.bulk_create(
+        [CatalogSnapshot(key=key, body=body, etag=_etag(body))],
+        update_conflicts=True,
+        unique_fields=['key'],
+        update_fields=['body', 'etag', 'built_at'],
+    )
+
+
+def render_products(product_ids):
+    """Re-render the fragments of ``product_ids``; deleted products are skipped."""
+    products = list(Product.objects.filter(pk__in=product_ids).for_catalog())
+    snapshots = [
+        ProductSnapshot(product=product, category_id=product.category_id, body=_renderer.render(data))
+        for product, data in zip(products, ProductSerializer(products, many=True).data)
+    ]
+    ProductSnapshot.objects.bulk_create(
+        snapshots,
+        batch_size=500,
+        update_conflicts=True,
+        unique_fields=['product'],
+        update_fields=['category_id', 'body', 'built_at'],
+    )
+    return products
+
+
+def assemble_category(category_id):
+    """Rebuild the listing blobs of one category from the stored fragments."""
+    if not Category.objects.filter(pk=category_id).exists():
+        CatalogSnapshot.objects.filter(key__startswith=f'products:{category_id}:').delete()
+        return
+    # Products that have never been rendered (e.g. created before snapshots
+    # existed) get their fragment now rather than being left out
+    missing = Product.objects.filter(category_id=category_id, stock__gt=0, snapshot__isnull=True)
+    missing_ids = list(missing.values_list('pk', flat=True))
+    if missing_ids:
+        render_products(missing_ids)
+
+    # One read of the fragments and their sort columns serves every sort
+    sort_fields = {field.lstrip('-') for sort in SNAPSHOT_SORTS for field in PRODUCT_ORDERINGS[sort]}
+    fragments = [
+        {**{field: row[f'product__{field}'] for field in sort_fields}, 'body': row['body']}
+        for row in ProductSnapshot.objects.filter(product__category_id=category_id, product__stock__gt=0).values(
+            'body', *(f'product__{field}' for field in sort_fields)
+        )
+    ]
+    for sort in SNAPSHOT_SORTS:
+        bodies = [row['body'] for row in _sort_fragments(fragments, sort)]
+        _store(category_key(category_id, sort), b'[' + b','.join(bodies) + b']')
+
+
+def assemble_categories():
+    categories = Category.objects.order_by('pk')
+    _store(CATEGORIES_KEY, _renderer.render(CategorySerializer(categories, many=True).data))
+
+
+def refresh(product_ids=(), category_ids=(), changed_category_ids=()):
+    """
+    Incrementally bring the snapshots up to date.
+
+    ``product_ids`` are products that were written or deleted, and
+    ``category_ids`` categories whose listings they were in. Categories in
+    ``changed_category_ids`` were themselves edited, so all of their products
+    (which embed the category) are re-rendered too.
+    """
+    product_ids = set(product_ids)
+    affected = set(category_ids) | set(changed_category_ids)
+    if changed_category_ids:
+        product_ids |= set(Product.objects.filter(category_id__in=changed_category_ids).values_list('pk', flat=True))
+        assemble_categories()
+
+    if product_ids:
+        affected |= set(
+            ProductSnapshot.objects.filter(product_id__in=product_ids).values_list('category_id', flat=True)
+        )
+        affected |= {product.category_id for product in render_products(product_ids)}
+
+    for category_id in affected:
+        assemble_category(category_id)
+
+
+def rebuild_all(batch_size=1000):
+    """Re-render every fragment and blob. Returns the number of products rendered."""
+    ProductSnapshot.objects.all().delete()
+    CatalogSnapshot.objects.all().delete()
+    product_ids = list(Product.objects.order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(product_ids), batch_size):
+        render_products(product_ids[start:start + batch_size])
+    for category_id in Category.objects.values_list('pk', flat=True):
+        assemble_category(category_id)
+    assemble_categories()
+    return len(product_ids)
+
+
+def stale_product_ids():
+    """
+    Products whose fragment is missing or older than the product, its
+    category or any of its features and images.
+
+    Writes that bypass the signal handlers (``update()``, bulk operations)
+    still move ``updated_at``, so comparing timestamps finds them without
+    re-rendering anything.
+    """
+    built_at = OuterRef('snapshot__built_at')
+    changed_children = [
+        Exists(model.objects.filter(product=OuterRef('pk'), updated_at__gt=built_at)) for model in (Feature, Image)
+    ]
+    return set(
+        Product.objects.filter(
+            Q(snapshot__isnull=True)
+            | Q(updated_at__gt=F('snapshot__built_at'))
+            | Q(category__updated_at__gt=F('snapshot__built_at'))
+            | changed_children[0]
+            | changed_children[1]
+        ).values_list('pk', flat=True)
+    )
+
+
+def refresh_stale():
+    """
+    Re-render only the stale fragments and their categories. Returns the number of products rendered.
+
+    Deleted rows leave nothing to compare timestamps with, so tombstones newer
+    than a category's blobs (or the category list) mark those for reassembly.
+    """
+    product_ids = stale_product_ids()
+    blobs_built_at = {
+        key.split(':')[1]: built_at
+        for key, built_at in CatalogSnapshot.objects.filter(
+            key__startswith='products:', key__endswith=f':{DEFAULT_PRODUCT_SORT}'
+        ).values_list('key', 'built_at')
+    }
+    changed_category_ids = [
+        category_id for category_id, updated_at in Category.objects.values_list('pk', 'updated_at')
+        if category_id not in blobs_built_at or updated_at > blobs_built_at[category_id]
+    ]
+
+    category_ids = set()
+    categories_built_at = CatalogSnapshot.objects.filter(key=CATEGORIES_KEY).values_list('built_at', flat=True).first()
+    deleted_category = False
+    tombstones = CatalogTombstone.objects.all()
+    if blobs_built_at and categories_built_at is not None:
+        tombstones = tombstones.filter(deleted_at__gt=min(categories_built_at, *blobs_built_at.values()))
+    for kind, object_id, category_id, deleted_at in tombstones.values_list(
+        'kind', 'object_id', 'category_id', 'deleted_at'
+    ):
+        if kind == CatalogTombstone.KIND_CATEGORY:
+            category_id = object_id
+            deleted_category = deleted_category or categories_built_at is None or deleted_at > categories_built_at
+        if category_id in blobs_built_at and deleted_at > blobs_built_at[category_id]:
+            category_ids.add(category_id)
+
+    refresh(product_ids, category_ids, changed_category_ids)
+    if deleted_category and not changed_category_ids:
+        assemble_categories()
+    return len(product_ids)
+
+
+def get_snapshot(key, category_id=None):
+    """The stored blob for ``key``, assembling the category's blobs first if missing."""
+    snapshot = CatalogSnapshot.objects.filter(key=key).first()
+    if snapshot is None:
+        if category_id is not None:
+            assemble_category(category_id)
+        else:
+            assemble_categories()
+        snapshot = CatalogSnapshot.objects.filter(key=key).first()
+    return snapshot
+
+
+# Changes are collected per thread and applied once after the surrounding
+# transaction commits, so a bulk edit refreshes each category only once
+_pending = threading.local()
+
+
+def _flush():
+    product_ids = getattr(_pending, 'product_ids', set())
+    category_ids = getattr(_pending, 'category_ids', set())
+    changed_category_ids = getattr(_pending, 'changed_category_ids', set())
+    _pending.product_ids, _pending.category_ids, _pending.changed_category_ids = set(), set(), set()
+    if product_ids or category_ids or changed_category_ids:
+        refresh(product_ids, category_ids, changed_category_ids)
+
+
+def schedule_refresh(product_ids=(), category_ids=(), changed_category_ids=()):
+    """Queue an incremental refresh to run when the current transaction commits."""
+    if not getattr(settings, 'CATALOG_SNAPSHOT_AUTO_REFRESH', False):
+        return
+    for name, values in (('product_ids', product_ids), ('category_ids', category_ids),
+                         ('changed_category_ids', changed_category_ids)):
+        pending = getattr(_pending, name, None)
+        if pending is None:
+            pending = set()
+            setattr(_pending, name, pending)
+        pending.update(values)
+    transaction.on_commit(_flush)
@@ -0,0 +1,116 @@
+"""
+Stock deduction and time-bounded stock reservations.
+
+A reservation holds a quantity of a product for a cart until it expires.
+Available stock is ``stock`` minus the quantities held by unexpired
+reservations; expired rows are ignored by every query and deleted in bulk
+by the ``release_expired_reservations`` sweeper. Placing, changing or
+releasing a hold bumps the catalog version, and cached listings never
+outlive the next expiry (see ``cache.catalog_entry_timeout``).
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, OuterRef, Value
+from django.db.models.functions import Now
+from django.utils import timezone
+
+from .cache import bump_catalog_version
+from .models import Product, StockReservation
+
+
+class InsufficientStock(Exception):
+    """Raised inside a stock transaction to roll it back when stock ran out."""
+
+    def __init__(self, product, quantity):
+        super().__init__(product.pk)
+        self.product = product
+        self.quantity = quantity
+
+
+def get_reservation_ttl():
+    return timedelta(seconds=getattr(settings, 'STOCK_RESERVATION_TTL', 900))
+
+
+def deduct_stock(quantities, products, cart=None):
+    """
+    Atomically take ``quantities`` ({product_id: quantity}) out of stock.
+
+    Must run inside a transaction. Each deduction is one conditional UPDATE
+    that only matches while enough stock is left beyond what other carts
+    hold, so concurrent orders can never oversell. The holds of ``cart``
+    itself are consumed.
+    """
+    for product_id, quantity in quantities.items():
+        updated = Product.objects.filter(
+            pk=product_id,
+            stock__gte=Value(quantity) + StockReservation.held_quantity(OuterRef('pk'), exclude_cart=cart),
+        ).update(stock=F('stock') - quantity, updated_at=Now())
+        if not updated:
+            raise InsufficientStock(products[product_id], quantity)
+    # The snapshots embed stock, but re-rendering them here would put that
+    # work on every order; updated_at marks them stale for
+    # build_catalog_snapshot --stale instead
+    if cart:
+        StockReservation.objects.filter(cart=cart).delete()
+
+
+def hold_stock(cart, quantities, ttl=None):
+    """
+    Replace the holds of ``cart`` with ``quantities`` ({product_id: quantity}).
+
+    Raises ``InsufficientStock`` (and keeps the previous holds) when a product
+    does not have enough unreserved stock. Returns the new reservations.
+    """
+    expires_at = timezone.now() + (ttl or get_reservation_ttl())
+    with transaction.atomic():
+        # Writing first takes the write lock up front on SQLite, and drops
+        # this cart's old holds before availability is computed
+        released, _ = StockReservation.objects.filter(cart=cart).delete()
+        products = (
+            Product.objects.select_for_update()
+            .with_available_stock()
+            .in_bulk(list(quantities))
+        )
+        for product_id, quantity in quantities.items():
+            product = products[product_id]
+            if product.available_stock < quantity:
+                raise InsufficientStock(product, quantity)
+        reservations = StockReservation.objects.bulk_create([
+            StockReservation(product_id=product_id, cart=cart, quantity=quantity, expires_at=expires_at)
+            for product_id, quantity in quantities.items()
+        ])
+        if released or reservations:
+            # Listings hide products whose stock is all held, so freeing or
+            # shrinking a hold can bring a product back just as a new one can
+            # hide it
+            transaction.on_commit(bump_catalog_version)
+    return reservations
+
+
+def release_cart(cart):
+    """Drop every hold of ``cart``. Returns the number of released reservations."""
+    released, _ = StockReservation.objects.filter(cart=cart).delete()
+    if released:
+        bump_catalog_version()
+    return released
+
+
+def release_expired(batch_size=1000):
+    """Delete expired reservations in batches. Returns the number deleted."""
+    now = timezone.now()
+    released = 0
+    while True:
+        ids = list(
+            StockReservation.objects.filter(expires_at__lte=now)
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            break
+        # No signals or cascades hang off reservations, so this is a single DELETE
+        deleted, _ = StockReservation.objects.filter(id__in=ids).delete()
+        released += deleted
+    if released:
+        bump_catalog_version()
+    return released
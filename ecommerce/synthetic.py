@@ -0,0 +1,208 @@
+"""
+Deterministic synthetic catalog data for benchmarks and scaling tests.
+
+Rows are written with ``bulk_create`` in fixed-size batches, so memory use is
+bounded by the batch size rather than the size of the dataset. The same seed
+always produces the same catalog.
+"""
+import itertools
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+from django.utils import timezone
+
+from .models import Category, Feature, Image, Order, Product
+
+# Dataset shapes shared by generate_fixtures and the benchmark commands
+PRESETS = {
+    'tiny': {'categories': 10, 'products': 1000, 'orders': 1000},
+    'small': {'categories': 50, 'products': 20000, 'orders': 10000},
+    'medium': {'categories': 1000, 'products': 200000, 'orders': 100000},
+    'large': {'categories': 10000, 'products': 1000000, 'orders': 500000},
+    'xl': {'categories': 50000, 'products': 5000000, 'orders': 2000000},
+}
+
+WORDS = [
+    'mobile', 'app', 'website', 'landing', 'page', 'seo', 'cloud', 'database', 'docker',
+    'kubernetes', 'payment', 'stripe', 'billing', 'api', 'integration', 'oauth', 'login',
+    'chatbot', 'automation', 'scraping', 'deploy', 'pipeline', 'microservices', 'design',
+    'dashboard', 'analytics', 'notification', 'firebase', 'react', 'django', 'python',
+    'performance', 'security', 'audit', 'migration', 'testing', 'bug', 'fix', 'custom',
+    'ecommerce', 'marketing', 'report', 'consulting', 'backend', 'frontend', 'responsive',
+]
+
+ORDER_PLATFORMS = ['fiverr', 'upwork']
+ORDER_STATUSES = ['pending'] * 3 + ['completed'] * 6 + ['cancelled']
+
+SYLLABLES = ['ka', 'lo', 'mi', 'ren', 'tas', 'vo', 'zu', 'pel', 'dor', 'qui', 'nax', 'bri']
+
+COLORS = ['#2563eb', '#16a34a', '#dc2626', '#9333ea', '#ea580c', '#0891b2']
+
+
+def _build_vocabulary():
+    # Real catalog text has a few very common words and a long tail of rare
+    # ones; pad the domain words with generated ones and weight them Zipf-style
+    generated = [a + b + c for a in SYLLABLES for b in SYLLABLES for c in SYLLABLES]
+    vocabulary = WORDS + generated
+    weights = [1 / (rank + 50) for rank in range(len(vocabulary))]
+    return vocabulary, list(itertools.accumulate(weights))
+
+
+VOCABULARY, CUM_WEIGHTS = _build_vocabulary()
+
+
+def _phrase(rng, length):
+    return ' '.join(rng.choices(VOCABULARY, cum_weights=CUM_WEIGHTS, k=length))
+
+
+def _batched(rows, batch_size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+@contextmanager
+def _explicit_created_at(model):
+    """
+    Let ``bulk_create`` keep the ``created_at`` values set on the instances.
+
+    ``auto_now_add`` would stamp every row with the current time. The flag is
+    switched off on the shared field for the duration, which is fine for a
+    fixture generator but not for code that runs next to requests.
+    """
+    field = model._meta.get_field('created_at')
+    auto_now_add = field.auto_now_add
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = auto_now_add
+
+
+def category_id(index):
+    return f'cat-{index}'
+
+
+def product_id(index):
+    return f'prod-{index}'
+
+
+def generate_catalog(categories=10, products=1000, features_per_product=3,
+                     images_per_product=1, seed=0, batch_size=2000):
+    """Create a synthetic catalog and return the number of products written."""
+    rng = random.Random(seed)
+
+    category_rows = (
+        Category(
+            id=category_id(index),
+            name=f'{_phrase(rng, 2).title()} {index}',
+            icon='🔧',
+            description=_phrase(rng, 20),
+            slug=f'category-{index}',
+        )
+        for index in range(categories)
+    )
+    for batch in _batched(category_rows, batch_size):
+        Category.objects.bulk_create(batch)
+
+    def product_rows():
+        for index in range(products):
+            yield Product(
+                id=product_id(index),
+                name=f'{_phrase(rng, 3).title()} {index}',
+                price=Decimal(rng.randint(500, 100000)) / 100,
+                description=_phrase(rng, 40),
+                category_id=category_id(rng.randrange(categories)),
+                stock=rng.choice([0, 5, 10, 10, 20, 50]),
+                rating=Decimal(rng.randint(0, 50)) / 10,
+                reviews=rng.randint(0, 500),
+                is_featured=rng.random() < 0.1,
+                color=rng.choice(COLORS),
+            )
+
+    for batch in _batched(product_rows(), batch_size):
+        Product.objects.bulk_create(batch)
+        Feature.objects.bulk_create([
+            Feature(product_id=product.id, text=_phrase(rng, 5))
+            for product in batch
+            for _ in range(features_per_product)
+        ])
+        Image.objects.bulk_create([
+            Image(
+                product_id=product.id,
+                url=f'https://images.example.com/{product.id}/{position}.png',
+                alt_text=product.name,
+            )
+            for product in batch
+            for position in range(images_per_product)
+        ])
+
+    return products
+
+
+def sample_terms(count, seed=0):
+    """Search terms drawn from the same vocabulary as the catalog."""
+    rng = random.Random(seed)
+    return rng.choices(VOCABULARY, cum_weights=CUM_WEIGHTS, k=count)
+
+
+def generate_orders(orders=1000, products=1000, days=365, max_items=4, seed=0, batch_size=2000):
+    """
+    Create synthetic orders whose ``order_details`` reference products of a
+    catalog made by ``generate_catalog`` with the same ``products`` count.
+
+    Orders are spread over the last ``days`` days, oldest first. Product
+    names and prices are read per batch, so memory stays bounded.
+    """
+    rng = random.Random(seed)
+    now = timezone.now()
+    step = timedelta(days=days) / max(orders, 1)
+    start = now - timedelta(days=days)
+
+    written = 0
+    for batch_start in range(0, orders, batch_size):
+        batch_indexes = range(batch_start, min(batch_start + batch_size, orders))
+        picks = [
+            [(rng.randrange(products), rng.randint(1, 3)) for _ in range(rng.randint(1, max_items))]
+            for _ in batch_indexes
+        ]
+        catalog = Product.objects.only('name', 'price').in_bulk(
+            {product_id(index) for items in picks for index, _ in items}
+        )
+
+        batch = []
+        for index, items in zip(batch_indexes, picks):
+            details = [
+                {
+                    'id': product_id(product_index),
+                    'name': catalog[product_id(product_index)].name,
+                    'price': str(catalog[product_id(product_index)].price),
+                    'quantity': quantity,
+                }
+                for product_index, quantity in items
+                if product_id(product_index) in catalog
+            ]
+            total = sum(Decimal(item['price']) * item['quantity'] for item in details)
+            order = Order(
+                customer_name=f'Customer {index}',
+                customer_email=f'customer{index}@example.com',
+                platform=rng.choice(ORDER_PLATFORMS),
+                order_details=details,  # The items list, as OrderViewSet stores it
+                total_amount=total,
+                status=rng.choice(ORDER_STATUSES),
+            )
+            order.created_at = start + step * index
+            batch.append(order)
+
+        with _explicit_created_at(Order):
+            Order.objects.bulk_create(batch)
+        written += len(batch)
+
+    return written
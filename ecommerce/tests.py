@@ -0,0 +1,513 @@
+import hashlib
+import json
+import shutil
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from smtplib import SMTPException
+from unittest import mock
+
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import transaction
+from django.db.models.functions import Now
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from ecommerce import outbox, rollups, search, snapshots, uploads
+from ecommerce.cache import catalog_entry_timeout, get_catalog_timeout
+from ecommerce.management.commands.check_query_plans import check_plans
+from ecommerce.models import (
+    PRODUCT_ORDERINGS, CatalogSnapshot, Category, Feature, Image, Order, OrderDailyRollup, OutboundEmail, Product,
+    ProductDailyRollup, StockReservation,
+)
+from ecommerce.pagination import ProductCursorPagination
+from ecommerce.rows import ProductRows
+from ecommerce.serializers import PRODUCT_FIELD_SETS, ProductSerializer
+from ecommerce.stock import InsufficientStock, hold_stock
+from ecommerce.synthetic import generate_catalog
+
+NO_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+
+
+@override_settings(CACHES=NO_CACHE, PERF_SAMPLE_RATE=0)
+class QueryCountTests(TestCase):
+    """
+    Every list and detail endpoint runs a fixed number of queries, however
+    many rows it returns. Each is measured at two sizes so that a query per
+    row (an N+1) fails the test instead of only changing the count.
+    Cached listings add the query that reads their validators and, on a
+    cache miss, the one that finds the next hold expiry.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        generate_catalog(categories=4, products=200)
+
+    def assertQueriesAtSizes(self, num, paths):
+        for path in paths:
+            with self.subTest(path=path), self.assertNumQueries(num):
+                response = self.client.get(path)
+                self.assertEqual(response.status_code, 200)
+
+    def test_product_list(self):
+        self.assertQueriesAtSizes(5, ['/store/products/?page_size=5', '/store/products/?page_size=50'])
+
+    def test_product_list_expanded(self):
+        fields = 'description,category,features,images'
+        self.assertQueriesAtSizes(6, [
+            f'/store/products/?expand={fields}&page_size=5',
+            f'/store/products/?expand={fields}&page_size=50',
+        ])
+
+    def test_product_list_cursor(self):
+        self.assertQueriesAtSizes(4, [
+            '/store/products/?pagination=cursor&page_size=5',
+            '/store/products/?pagination=cursor&page_size=50',
+        ])
+        next_link = self.client.get('/store/products/?pagination=cursor&page_size=5').json()['next']
+        self.assertQueriesAtSizes(4, [next_link])
+
+    def test_product_detail(self):
+        product_ids = list(Product.objects.available().values_list('pk', flat=True)[:2])
+        self.assertQueriesAtSizes(3, [f'/store/products/{product_id}/' for product_id in product_ids])
+
+    def test_featured(self):
+        self.assertQueriesAtSizes(2, ['/store/products/featured/'])
+        Product.objects.filter(is_featured=False).update(is_featured=True)
+        self.assertQueriesAtSizes(2, ['/store/products/featured/'])
+
+    def test_products_by_category(self):
+        few, many = Category.objects.order_by('pk')[:2]
+        kept = Product.objects.filter(category=few)[:3]
+        Product.objects.filter(category=few).exclude(pk__in=kept).update(category=many)
+        self.assertQueriesAtSizes(6, [f'/store/products/by-category/{category.slug}/' for category in (few, many)])
+
+    def test_category_list(self):
+        self.assertQueriesAtSizes(3, ['/store/categories/'])
+        Category.objects.bulk_create([
+            Category(id=f'extra-{index}', name=f'Extra {index}', slug=f'extra-{index}') for index in range(20)
+        ])
+        self.assertQueriesAtSizes(3, ['/store/categories/'])
+
+    def test_category_detail(self):
+        slugs = Category.objects.order_by('pk').values_list('slug', flat=True)[:2]
+        self.assertQueriesAtSizes(1, [f'/store/categories/{slug}/' for slug in slugs])
+
+
+@override_settings(CACHES=NO_CACHE, PERF_SAMPLE_RATE=0)
+class CursorPaginationTests(TestCase):
+    """Walking every cursor page of a sort returns each listed product exactly once."""
+
+    @classmethod
+    def setUpTestData(cls):
+        generate_catalog(categories=3, products=90)
+        # Plenty of ties on every sort column
+        product_ids = list(Product.objects.order_by('pk').values_list('pk', flat=True))
+        Product.objects.filter(pk__in=product_ids[::2]).update(price='10.00', rating='4.0', is_featured=True)
+        Product.objects.filter(pk__in=product_ids[1::3]).update(created_at=timezone.now())
+
+    def walk(self, path):
+        seen = []
+        while path:
+            response = self.client.get(path)
+            self.assertEqual(response.status_code, 200)
+            seen += [product['id'] for product in response.json()['results']]
+            path = response.json()['next']
+        return seen
+
+    def test_every_sort_walks_each_product_once(self):
+        for sort in PRODUCT_ORDERINGS:
+            with self.subTest(sort=sort):
+                expected = list(Product.objects.available().sorted(sort).values_list('pk', flat=True))
+                self.assertEqual(self.walk(f'/store/products/?pagination=cursor&page_size=7&sort={sort}'), expected)
+
+    def test_malformed_cursor_is_not_found(self):
+        encode = ProductCursorPagination().encode_cursor
+        for cursor in ('not-base64!', encode({'price': 1}), encode(['10.00']), encode(['cheap', 'prod-1']),
+                       encode([None, 'prod-1'])):
+            with self.subTest(cursor=cursor):
+                response = self.client.get('/store/products/', {'sort': 'price-low-high', 'cursor': cursor})
+                self.assertEqual(response.status_code, 404)
+
+
+@override_settings(CACHES=NO_CACHE, PERF_SAMPLE_RATE=0)
+class SearchTests(TestCase):
+    """Search filters and facet counts see every match, not just the ranked candidates."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.widgets = Category.objects.create(id='widgets', name='Widgets', slug='widgets')
+        cls.spares = Category.objects.create(id='spares', name='Spares', slug='spares')
+        count = search.SEARCH_CANDIDATE_LIMIT + 100
+        Product.objects.bulk_create([
+            Product(id=f'widget-{index}', name=f'Widget {index}', description='A widget', price='10.00',
+                    category=cls.spares if index >= count - 3 else cls.widgets, stock=5, rating='4.0', color='#000000')
+            for index in range(count)
+        ])
+        Product.objects.create(id='gadget', name='Gadget', description='Not one', price='10.00',
+                               category=cls.widgets, stock=5, rating='4.0', color='#000000')
+        search.rebuild_index()
+
+    def test_facets_count_every_match(self):
+        facets = self.client.get('/store/products/facets/?search=widget').json()
+        self.assertEqual(facets['total'], search.SEARCH_CANDIDATE_LIMIT + 100)
+        self.assertEqual({row['id']: row['count'] for row in facets['categories']},
+                         {'widgets': search.SEARCH_CANDIDATE_LIMIT + 97, 'spares': 3})
+
+    def test_relevance_page_reaches_beyond_the_candidates(self):
+        results = self.client.get('/store/products/?search=widget&categories=spares').json()['results']
+        count = search.SEARCH_CANDIDATE_LIMIT + 100
+        self.assertEqual(sorted(product['id'] for product in results),
+                         sorted(f'widget-{index}' for index in range(count - 3, count)))
+
+    def test_sorted_search_filters_every_match(self):
+        results = self.client.get('/store/products/?search=widget&categories=spares&sort=price-low-high').json()
+        self.assertEqual(len(results['results']), 3)
+
+
+@override_settings(PERF_SAMPLE_RATE=0)
+class ConditionalRequestTests(TestCase):
+    """Catalog validators follow the database, not the cache that served the body."""
+
+    path = '/store/products/?page_size=5'
+
+    @classmethod
+    def setUpTestData(cls):
+        generate_catalog(categories=3, products=30)
+
+    def setUp(self):
+        cache.clear()
+
+    def assertRevalidates(self, status_code, etag, **headers):
+        response = self.client.get(self.path, HTTP_IF_NONE_MATCH=etag, **headers)
+        self.assertEqual(response.status_code, status_code)
+        return response
+
+    def test_unchanged_catalog_is_not_modified(self):
+        etag = self.client.get(self.path)['ETag']
+        response = self.assertRevalidates(304, etag)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_write_changes_the_etag(self):
+        etag = self.client.get(self.path)['ETag']
+        product = Product.objects.available().first()
+        product.name = 'Renamed'
+        product.save()
+        self.assertNotEqual(self.assertRevalidates(200, etag)['ETag'], etag)
+
+    def test_write_that_skips_signals_changes_the_etag(self):
+        # As a write from another process would: this cache's version stays put
+        etag = self.client.get(self.path)['ETag']
+        Product.objects.filter(pk=Product.objects.available().values('pk')[:1]).update(updated_at=Now())
+        self.assertRevalidates(200, etag)
+
+    def test_etag_varies_by_encoding(self):
+        plain = self.client.get(self.path)
+        gzipped = self.client.get(self.path, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(gzipped['Content-Encoding'], 'gzip')
+        self.assertNotEqual(plain['ETag'], gzipped['ETag'])
+        for response in (plain, gzipped, self.assertRevalidates(304, gzipped['ETag'], HTTP_ACCEPT_ENCODING='gzip')):
+            self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertRevalidates(200, gzipped['ETag'])
+
+
+class SnapshotTests(TestCase):
+    """``build_catalog_snapshot --stale`` catches up with deletions as well as edits."""
+
+    @classmethod
+    def setUpTestData(cls):
+        generate_catalog(categories=3, products=60)
+        snapshots.rebuild_all()
+
+    def blob(self, key):
+        return json.loads(bytes(CatalogSnapshot.objects.get(key=key).body))
+
+    def refresh_stale(self):
+        call_command('build_catalog_snapshot', '--stale', stdout=StringIO())
+
+    def test_deleted_product_leaves_its_listings(self):
+        category = Category.objects.order_by('pk').first()
+        key = snapshots.category_key(category.pk, snapshots.SNAPSHOT_SORTS[0])
+        product_id = self.blob(key)[0]['id']
+        Product.objects.get(pk=product_id).delete()
+        self.refresh_stale()
+        self.assertNotIn(product_id, [product['id'] for product in self.blob(key)])
+
+    def test_deleted_category_leaves_the_category_list(self):
+        category_id = Category.objects.order_by('pk').values_list('pk', flat=True).first()
+        Category.objects.get(pk=category_id).delete()
+        self.refresh_stale()
+        self.assertNotIn(category_id, [row['id'] for row in self.blob(snapshots.CATEGORIES_KEY)])
+        self.assertFalse(CatalogSnapshot.objects.filter(key__startswith=f'products:{category_id}:').exists())
+
+
+@override_settings(CACHES=NO_CACHE, PERF_SAMPLE_RATE=0)
+class StockReservationTests(TestCase):
+    """A cart's hold keeps stock away from every other cart until it is ordered, released or expires."""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(id='widgets', name='Widgets', slug='widgets')
+        cls.product = Product.objects.create(id='widget', name='Widget', description='A widget', price='10.00',
+                                             category=category, stock=2, rating='4.0', color='#000000')
+
+    def hold(self, cart, quantity):
+        items = [{'id': 'widget', 'quantity': quantity}]
+        return self.client.post('/store/reservations/', {'cart': cart, 'items': items}, content_type='application/json')
+
+    def order(self, cart, quantity):
+        details = {'items': [{'id': 'widget', 'quantity': quantity}], 'total': 10 * quantity,
+                   'email': 'buyer@example.com', 'cart': cart}
+        return self.client.post('/store/orders/', {'platform': 'fiverr', 'orderDetails': json.dumps(details)})
+
+    def listed_ids(self):
+        return [product['id'] for product in self.client.get('/store/products/').json()['results']]
+
+    def test_hold_hides_stock_from_other_carts(self):
+        self.assertEqual(self.hold('a', 2).status_code, 201)
+        self.assertNotIn('widget', self.listed_ids())
+        self.assertEqual(self.hold('b', 1).status_code, 409)
+        # The holding cart can change its own hold
+        self.assertEqual(self.hold('a', 1).status_code, 201)
+        self.assertEqual(self.hold('b', 1).status_code, 201)
+
+    def test_order_consumes_its_own_hold_only(self):
+        self.hold('a', 2)
+        self.assertEqual(self.order('b', 1).status_code, 400)
+        self.assertEqual(self.order('a', 2).status_code, 201)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 0)
+        self.assertFalse(StockReservation.objects.exists())
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_expired_holds_are_released(self):
+        self.hold('a', 2)
+        StockReservation.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertIn('widget', self.listed_ids())
+        self.assertEqual(self.order('b', 2).status_code, 201)
+        call_command('release_expired_reservations', stdout=StringIO())
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_cached_listings_expire_with_the_next_hold(self):
+        self.assertEqual(catalog_entry_timeout(), get_catalog_timeout())
+        hold_stock('a', {'widget': 1}, ttl=timedelta(seconds=30))
+        self.assertLessEqual(catalog_entry_timeout(), 30)
+        with self.assertRaises(InsufficientStock):
+            hold_stock('b', {'widget': 2})
+
+
+@override_settings(CACHES=NO_CACHE, PERF_SAMPLE_RATE=0, ORDER_FILE_MAX_SIZE=1024)
+class OrderFileTests(TestCase):
+    """Attachments are stored once per content, capped in size and collected when unreferenced."""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(id='widgets', name='Widgets', slug='widgets')
+        Product.objects.create(id='widget', name='Widget', description='A widget', price='10.00',
+                               category=category, stock=10, rating='4.0', color='#000000')
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def order(self, content, name='brief.pdf'):
+        details = {'items': [{'id': 'widget', 'quantity': 1}], 'total': 10, 'email': 'buyer@example.com'}
+        return self.client.post('/store/orders/', {
+            'platform': 'fiverr',
+            'orderDetails': json.dumps(details),
+            'file': SimpleUploadedFile(name, content, content_type='application/pdf'),
+        })
+
+    def blobs(self):
+        return sorted(uploads.iter_blobs())
+
+    def test_identical_uploads_share_one_blob(self):
+        content = b'%PDF- the same brief'
+        for _ in range(2):
+            self.assertEqual(self.order(content).status_code, 201)
+        digest = hashlib.sha256(content).hexdigest()
+        name = f'{uploads.ORDER_FILE_DIR}/{digest[:2]}/{digest[2:4]}/{digest}.pdf'
+        self.assertEqual(list(Order.objects.values_list('file', flat=True)), [name, name])
+        self.assertEqual(self.blobs(), [name])
+
+    def test_oversized_upload_is_rejected(self):
+        self.assertEqual(self.order(b'x' * 2048).status_code, 413)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(self.blobs(), [])
+
+    def test_gc_deletes_only_unreferenced_blobs(self):
+        self.order(b'%PDF- kept')
+        kept = Order.objects.get().file.name
+        orphan = uploads.store_order_file(ContentFile(b'%PDF- orphaned', name='orphan.pdf'))
+        # Both are inside the grace period, which covers uncommitted orders
+        self.assertEqual(uploads.collect_garbage(), (0, 0))
+        with override_settings(ORDER_FILE_GC_GRACE=0):
+            self.assertEqual(uploads.collect_garbage(), (1, len(b'%PDF- orphaned')))
+        self.assertEqual(self.blobs(), [kept])
+        self.assertFalse(default_storage.exists(orphan))
+
+
+class OrderRollupTests(TestCase):
+    """The rollups kept up by the order signals match a rebuild from the orders table."""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(id='widgets', name='Widgets', slug='widgets')
+        cls.product = Product.objects.create(id='widget', name='Widget', description='A widget', price='10.00',
+                                             category=category, stock=10, rating='4.0', color='#000000')
+
+    def rollup_rows(self):
+        orders = OrderDailyRollup.objects.filter(orders__gt=0)
+        products = ProductDailyRollup.objects.filter(quantity__gt=0)
+        return (
+            sorted(orders.values_list('day', 'platform', 'status', 'orders', 'revenue')),
+            sorted(products.values_list('day', 'product_id', 'status', 'quantity', 'revenue')),
+        )
+
+    def create_order(self, items, total):
+        return Order.objects.create(customer_email='buyer@example.com', platform='fiverr', order_details=items,
+                                    total_amount=total)
+
+    def test_rebuild_matches_incremental_rollups(self):
+        unpriced = self.create_order([{'id': 'widget', 'quantity': 2}], '20.00')
+        priced = self.create_order([{'id': 'widget', 'quantity': 1, 'price': '9.00'}], '9.00')
+        deleted = self.create_order([{'id': 'widget', 'quantity': 3}], '30.00')
+
+        # A later price change must not move what the unpriced order counted
+        Product.objects.filter(pk='widget').update(price='25.00')
+        unpriced.status = 'shipped'
+        unpriced.save()
+        priced.status = 'cancelled'
+        priced.save()
+        deleted.delete()
+
+        incremental = self.rollup_rows()
+        self.assertEqual(
+            [row[2:] for row in incremental[1]],
+            [('cancelled', 1, Decimal('9.00')), ('shipped', 2, Decimal('20.00'))],
+        )
+        rollups.rebuild()
+        self.assertEqual(self.rollup_rows(), incremental)
+
+
+class OutboxTests(TestCase):
+    """Emails are queued with the request's transaction and delivered by the worker."""
+
+    def test_rolled_back_email_is_never_sent(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            OutboundEmail.queue('Hello', ['a@example.com'], body='Hi')
+            raise RuntimeError
+        self.assertEqual(outbox.process_outbox(), (0, 0))
+        self.assertEqual(mail.outbox, [])
+
+    def test_process_outbox_delivers_and_marks_sent(self):
+        OutboundEmail.queue('Hello', ['a@example.com'], body='Hi')
+        OutboundEmail.queue('Receipt', ['b@example.com'], html_body='<p>Thanks</p>')
+        self.assertEqual(outbox.process_outbox(batch_size=1), (2, 0))
+        self.assertEqual(sorted(message.subject for message in mail.outbox), ['Hello', 'Receipt'])
+        self.assertEqual(mail.outbox[1].alternatives, [('<p>Thanks</p>', 'text/html')])
+        self.assertFalse(OutboundEmail.objects.exclude(status=OutboundEmail.STATUS_SENT, sent_at__isnull=False).exists())
+        self.assertEqual(outbox.process_outbox(), (0, 0))
+
+    def test_failed_send_is_retried_with_backoff(self):
+        email = OutboundEmail.queue('Hello', ['a@example.com'], body='Hi')
+        with mock.patch('ecommerce.outbox.EmailMultiAlternatives.send', side_effect=SMTPException('down')):
+            started = timezone.now()
+            self.assertEqual(outbox.process_outbox(max_attempts=2), (0, 1))
+            email.refresh_from_db()
+            self.assertEqual((email.status, email.attempts), (OutboundEmail.STATUS_PENDING, 1))
+            self.assertIn('SMTPException: down', email.last_error)
+            self.assertGreaterEqual(email.next_attempt_at, started + outbox.retry_delay(1))
+            # Not due again until the backoff has passed
+            self.assertEqual(outbox.process_outbox(max_attempts=2), (0, 0))
+
+            OutboundEmail.objects.filter(pk=email.pk).update(next_attempt_at=started - timedelta(seconds=1))
+            self.assertEqual(outbox.process_outbox(max_attempts=2), (0, 1))
+            email.refresh_from_db()
+            self.assertEqual((email.status, email.attempts), (OutboundEmail.STATUS_FAILED, 2))
+        self.assertEqual(mail.outbox, [])
+
+
+@override_settings(CATALOG_CHANGES_LAG=0, PERF_SAMPLE_RATE=0)
+class CatalogChangesTests(TestCase):
+    """The change feed returns what was written and deleted after a token, and nothing before it."""
+
+    @classmethod
+    def setUpTestData(cls):
+        generate_catalog(categories=3, products=20)
+
+    def changes(self, token=None):
+        response = self.client.get('/store/catalog/changes/', {'since': token} if token else {})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_changes_after_a_token(self):
+        first = self.changes()
+        self.assertTrue(first['reset'])
+
+        updated, deleted = Product.objects.order_by('pk')[:2]
+        updated.name = 'Renamed'
+        updated.save()
+        deleted_id = deleted.pk
+        deleted.delete()
+        category_id = Category.objects.exclude(pk=updated.category_id).values_list('pk', flat=True).first()
+        Category.objects.get(pk=category_id).delete()
+
+        feed = self.changes(first['token'])
+        self.assertFalse(feed['reset'])
+        self.assertEqual([(product['id'], product['name']) for product in feed['products']], [(updated.pk, 'Renamed')])
+        self.assertIn(deleted_id, feed['deleted']['products'])
+        self.assertEqual(feed['deleted']['categories'], [category_id])
+
+        # Nothing happened after the new token
+        later = self.changes(feed['token'])
+        self.assertEqual((later['products'], later['categories']), ([], []))
+        self.assertEqual(later['deleted'], {'products': [], 'categories': []})
+
+    def test_invalid_token_is_rejected(self):
+        self.assertEqual(self.client.get('/store/catalog/changes/', {'since': '!!'}).status_code, 400)
+
+
+class ProductRowsTests(TestCase):
+    """ProductRows renders byte for byte what ProductSerializer does."""
+
+    @classmethod
+    def setUpTestData(cls):
+        generate_catalog(categories=4, products=120, images_per_product=2)
+        # Products without children render empty lists and a null image
+        bare = list(Product.objects.order_by('pk').values_list('pk', flat=True)[:5])
+        Image.objects.filter(product_id__in=bare).delete()
+        Feature.objects.filter(product_id__in=bare).delete()
+
+    def test_output_matches_serializer(self):
+        renderer = JSONRenderer()
+        field_sets = {**PRODUCT_FIELD_SETS, 'image': ['id', 'name', 'image']}
+        for name, fields in field_sets.items():
+            rows = ProductRows(fields)
+            for start in (0, 40, 80):
+                page = Product.objects.sorted(None)[start:start + 40]
+                with self.subTest(fields=name, start=start):
+                    expected = ProductSerializer(page.for_fields(fields), many=True, fields=fields).data
+                    self.assertEqual(renderer.render(rows.serialize(list(rows.values(page)))), renderer.render(expected))
+
+
+class QueryPlanTests(TestCase):
+    """The check_query_plans command's check, on a small catalog."""
+
+    @classmethod
+    def setUpTestData(cls):
+        generate_catalog(categories=5, products=300)
+
+    def test_catalog_queries_are_indexed(self):
+        failures = [f"{name}: {'; '.join(problems)}" for name, _, _, problems in check_plans() if problems]
+        self.assertEqual(failures, [])
@@ -0,0 +1,155 @@
+"""
+Content-addressed storage for order attachments.
+
+Uploads are streamed to a temporary file in chunks while their SHA-256 is
+computed, so an attachment is never held in memory and an oversized one is
+rejected as soon as it passes ``ORDER_FILE_MAX_SIZE``. The stored name is
+derived from the digest, so the same brief uploaded again (a retried order,
+say) reuses the blob that is already stored. Blobs no order points at are
+removed by ``manage.py gc_order_files``.
+"""
+import hashlib
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.files.uploadhandler import FileUploadHandler
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from .models import Order
+
+ORDER_FILE_DIR = 'order_files/sha256'
+
+
+def get_max_size():
+    return getattr(settings, 'ORDER_FILE_MAX_SIZE', 10 * 1024 * 1024)
+
+
+def get_gc_grace():
+    return timedelta(seconds=getattr(settings, 'ORDER_FILE_GC_GRACE', 3600))
+
+
+class UploadTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'The attached file is too large.'
+    default_code = 'upload_too_large'
+
+
+class HashedUploadedFile(TemporaryUploadedFile):
+    """A streamed upload that knows the SHA-256 of its content."""
+    sha256 = None
+
+
+class HashingFileUploadHandler(FileUploadHandler):
+    """Stream each uploaded file to disk, hashing it and enforcing the size cap."""
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.max_size = get_max_size()
+        self.digest = hashlib.sha256()
+        self.size = 0
+        self.file = HashedUploadedFile(self.file_name, self.content_type, 0, self.charset, self.content_type_extra)
+
+    def receive_data_chunk(self, raw_data, start):
+        self.size += len(raw_data)
+        if self.size > self.max_size:
+            self.file.close()  # Deletes the partial temporary file
+            raise UploadTooLarge(f'The attached file is larger than {self.max_size} bytes.')
+        self.digest.update(raw_data)
+        self.file.write(raw_data)
+
+    def file_complete(self, file_size):
+        self.file.seek(0)
+        self.file.size = file_size
+        self.file.sha256 = self.digest.hexdigest()
+        return self.file
+
+    def upload_interrupted(self):
+        if hasattr(self, 'file'):
+            self.file.close()
+
+
+def file_sha256(file):
+    """The SHA-256 of an uploaded file, reading it in chunks if the upload handler didn't."""
+    digest = getattr(file, 'sha256', None)
+    if digest:
+        return digest
+    hasher = hashlib.sha256()
+    for chunk in file.chunks():
+        hasher.update(chunk)
+    file.seek(0)
+    return hasher.hexdigest()
+
+
+def blob_name(digest, filename):
+    """``order_files/sha256/ab/cd/abcd...ef.pdf`` for a digest and the uploaded file name."""
+    extension = os.path.splitext(filename or '')[1].lower()
+    if not extension[1:].isalnum() or len(extension) > 10:
+        extension = ''
+    return f'{ORDER_FILE_DIR}/{digest[:2]}/{digest[2:4]}/{digest}{extension}'
+
+
+def _touch(storage, name):
+    """Mark a reused blob as recent so gc_order_files leaves it alone until the order commits."""
+    try:
+        os.utime(storage.path(name))
+    except NotImplementedError:  # Remote storage; the grace period is all there is
+        pass
+
+
+def store_order_file(file, storage=default_storage):
+    """
+    Store an uploaded attachment once per content and return its storage name.
+
+    The name is also what ``Order.file`` is set to; assigning it does not
+    copy the file again.
+    """
+    if file.size > get_max_size():
+        raise UploadTooLarge(f'The attached file is larger than {get_max_size()} bytes.')
+    name = blob_name(file_sha256(file), file.name)
+    if storage.exists(name):
+        _touch(storage, name)
+        return name
+    saved = storage.save(name, file)  # Copied from the temporary file in chunks
+    if saved != name:
+        # A concurrent request stored the same content first; keep that copy
+        storage.delete(saved)
+    return name
+
+
+def iter_blobs(storage=default_storage, directory=ORDER_FILE_DIR):
+    """Every stored blob name under ``directory``."""
+    if not storage.exists(directory):
+        return
+    subdirectories, files = storage.listdir(directory)
+    for name in files:
+        yield f'{directory}/{name}'
+    for subdirectory in subdirectories:
+        yield from iter_blobs(storage, f'{directory}/{subdirectory}')
+
+
+def collect_garbage(storage=default_storage, dry_run=False):
+    """
+    Delete stored blobs that no order points at. Returns ``(deleted, bytes)``.
+
+    Blobs newer than ``ORDER_FILE_GC_GRACE`` are kept: they may belong to an
+    order whose transaction has not committed yet.
+    """
+    referenced = set(
+        Order.objects.filter(file__startswith=f'{ORDER_FILE_DIR}/')
+        .values_list('file', flat=True).iterator(chunk_size=2000)
+    )
+    cutoff = timezone.now() - get_gc_grace()
+    deleted = freed = 0
+    for name in iter_blobs(storage):
+        if name in referenced or storage.get_modified_time(name) > cutoff:
+            continue
+        freed += storage.size(name)
+        deleted += 1
+        if not dry_run:
+            storage.delete(name)
+    return deleted, freed
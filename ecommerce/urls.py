@@ -7,9 +7,16 @@ router.register(r'categories', views.CategoryViewSet, basename='category')
 router.register(r'products', views.ProductViewSet, basename='product')
 router.register(r'contact', views.ContactViewSet)  # Add this line
 router.register(r'orders', views.OrderViewSet, basename='order')
+router.register(r'analytics', views.OrderAnalyticsViewSet, basename='analytics')
 
 urlpatterns = [
     path('', include(router.urls)),
     path('products/by-category/<slug:slug>/', views.ProductsByCategoryView.as_view(), name='products-by-category'),
+    path('catalog/changes/', views.CatalogChangesView.as_view(), name='catalog-changes'),
+    path('catalog/export/', views.CatalogExportView.as_view(), name='catalog-export'),
+    path('catalog/snapshot/', views.CatalogSnapshotView.as_view(), name='catalog-snapshot'),
+    path('catalog/snapshot/<slug:slug>/', views.CatalogSnapshotView.as_view(), name='catalog-snapshot-category'),
+    path('reservations/', views.StockReservationView.as_view(), name='reservations'),
+    path('reservations/<str:cart>/', views.StockReservationView.as_view(), name='reservation-detail'),
 
 ]
\ No newline at end of file
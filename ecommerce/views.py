@@ -1,30 +1,97 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
-from django.core.mail import send_mail
 from django.conf import settings
-from rest_framework.pagination import PageNumberPagination
+from django.db import transaction
+from django.db.models import Count, Q
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils import timezone
+from django.utils.dateparse import parse_date
 
 from django.template.loader import render_to_string
-from .models import Category, Product, Contact, Newsletter, Order
+from .models import (
+    DEFAULT_PRODUCT_SORT, Category, Product, Contact, Newsletter, Order, OutboundEmail, StockReservation
+)
 from .serializers import (
     CategorySerializer, ProductSerializer, ContactSerializer,
-    NewsletterSerializer, OrderSerializer
+    NewsletterSerializer, OrderSerializer, PRODUCT_LIST_FIELDS
 )
 from rest_framework.views import APIView
-
-
-class ProductPagination(PageNumberPagination):
-    page_size = 10  # Number of products per page
-    page_size_query_param = 'page_size'  # Allow the client to specify the page size
-    max_page_size = 100  # Maximum number of products per page
-
-
-class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
+from . import changes, rollups, search, snapshots
+from .cache import bump_catalog_version, cached_catalog_response, conditional_catalog_response
+from .export import iter_catalog_ndjson
+from .facets import compute_facets
+from .instrumentation import timed
+from .pagination import ProductCursorPagination, ProductPagination
+from .rows import ProductRows
+from .sideload import included_categories, parse_sideload
+from .stock import InsufficientStock, deduct_stock, hold_stock, release_cart
+from .uploads import HashingFileUploadHandler, store_order_file
+
+SEARCH_RESULT_LIMIT = 5  # Number of products returned for a search query
+
+
+def sideloaded_list(products, sideload):
+    """An unpaginated product list, wrapped with its ``included`` categories when side-loading."""
+    if not sideload:
+        return products
+    return {'results': products, 'included': {'categories': included_categories(products)}}
+
+
+class SparseFieldsMixin:
+    """
+    Let clients choose the serialized fields.
+
+    ``?fields=a,b`` replaces the default fields of the action and
+    ``?expand=c`` adds to them; unknown names are a 400. Views load only what
+    ``requested_fields()`` names.
+    """
+
+    def default_fields(self):
+        return self.get_serializer_class().default_fields()
+
+    def parse_fields_param(self, name):
+        value = self.request.query_params.get(name, '')
+        fields = [field.strip() for field in value.split(',') if field.strip()]
+        unknown = set(fields) - set(self.get_serializer_class().Meta.fields)
+        if unknown:
+            raise ValidationError({name: f"Unknown fields: {', '.join(sorted(unknown))}"})
+        return fields
+
+    def requested_fields(self):
+        if not hasattr(self, '_requested_fields'):
+            fields = self.parse_fields_param('fields') or self.default_fields()
+            fields = set(fields) | set(self.parse_fields_param('expand'))
+            # Keep the serializer's field order
+            self._requested_fields = [name for name in self.get_serializer_class().Meta.fields if name in fields]
+        return self._requested_fields
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs.setdefault('fields', self.requested_fields())
+        return super().get_serializer(*args, **kwargs)
+
+
+class CategoryViewSet(SparseFieldsMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     lookup_field = 'slug'  # Use 'slug' instead of 'id' for category lookup_field = 'slug'  # Use 'slug' instead of the default 'id'
 
+    def get_queryset(self):
+        fields = self.requested_fields()
+        queryset = Category.objects.all()
+        if 'product_count' in fields:
+            queryset = queryset.annotate(product_count=Count('products', filter=Q(products__stock__gt=0)))
+        columns = {field.name for field in Category._meta.concrete_fields}.intersection(fields)
+        return queryset.only('id', 'slug', *columns)
+
+    @conditional_catalog_response('categories')
+    @cached_catalog_response('categories')
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
     @action(detail=True, methods=['get'], url_path='details')
     def get_category_details(self, request, pk=None):
         """Fetch category details by slug."""
@@ -36,53 +103,108 @@ class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
             return Response({"error": "Category not found"}, status=status.HTTP_404_NOT_FOUND)
 
 
-class ProductViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = Product.objects.filter(stock__gt=0)  # Exclude out-of-stock products
+class ProductViewSet(SparseFieldsMixin, viewsets.ReadOnlyModelViewSet):
+    queryset = Product.objects.available().for_catalog()  # Exclude out-of-stock and fully reserved products
     serializer_class = ProductSerializer
     pagination_class = ProductPagination  # Enable pagination
 
-    def get_queryset(self):
-        queryset = Product.objects.filter(stock__gt=0)  # Exclude out-of-stock products
-        categories = self.request.query_params.get('categories', None)  # Get the 'categories' query parameter
-        sort = self.request.query_params.get('sort', 'featured')  # Get the 'sort' query parameter, default to 'featured'
+    @property
+    def paginator(self):
+        """Page numbers by default; keyset pagination with ?pagination=cursor."""
+        if not hasattr(self, '_paginator'):
+            params = self.request.query_params
+            if params.get('pagination') == 'cursor' or 'cursor' in params:
+                self._paginator = ProductCursorPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
+    @conditional_catalog_response('products')
+    @cached_catalog_response('products')
+    def list(self, request, *args, **kwargs):
+        # Serialized from values() rows by ProductRows rather than through
+        # ProductSerializer; the output is the same (see tests.py)
+        sideload = 'categories' in parse_sideload(request)
+        queryset = self.filter_queryset(self.get_queryset())
+        rows = ProductRows(self.requested_fields(), sideload_categories=sideload)
+        ordering = [expression.lstrip('-') for expression in queryset.query.order_by if isinstance(expression, str)]
+        queryset = rows.values(queryset, extra=ordering)  # Cursor pages read the ordering back
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            data = rows.serialize(page)
+            response = self.get_paginated_response(data)
+            if sideload:
+                response.data['included'] = {'categories': included_categories(data)}
+            return response
+        return Response(sideloaded_list(rows.serialize(list(queryset)), sideload))
+
+    def filter_products(self, queryset, apply_categories=True):
+        """
+        Apply the search and category filters of the request to ``queryset``.
+
+        Shared by the product list and the facet counts so both always agree
+        on what matches.
+        """
         search_query = self.request.query_params.get('search', None)  # Get the 'search' query parameter
 
-        # Apply search filter
+        # Apply search filter (FTS5 index where available)
         if search_query:
-            queryset = queryset.filter(
-                name__icontains=search_query
-            ) | queryset.filter(
-                description__icontains=search_query
-            )
+            queryset = search.search_products(queryset, search_query)
+
+        if apply_categories:
+            queryset = self.filter_categories(queryset)
+        return queryset
 
-        # Filter by categories
+    def filter_categories(self, queryset):
+        categories = self.request.query_params.get('categories', None)  # Get the 'categories' query parameter
         if categories:
             category_ids = categories.split(",")  # Split the comma-separated string into a list
             queryset = queryset.filter(category__id__in=category_ids)  # Filter products by category IDs
+        return queryset
+
+    def default_fields(self):
+        if self.action in ('list', 'featured'):
+            return PRODUCT_LIST_FIELDS
+        return super().default_fields()
+
+    def get_queryset(self):
+        queryset = Product.objects.available()  # Exclude out-of-stock and fully reserved products
+        sort = self.request.query_params.get('sort', None)  # Get the 'sort' query parameter
+        search_query = self.request.query_params.get('search', None)
+
+        # Best matches first, unless the client picked a sort
+        if sort is None and search_query and search.is_available():
+            queryset = search.top_ranked(self.filter_categories(queryset), search_query, SEARCH_RESULT_LIMIT)
+            return queryset.for_fields(self.requested_fields())[:SEARCH_RESULT_LIMIT]
+
+        queryset = self.filter_products(queryset)
 
         # Apply sorting
-        if sort == 'price-low-high':
-            queryset = queryset.order_by('price')  # Sort by price (ascending)
-        elif sort == 'price-high-low':
-            queryset = queryset.order_by('-price')  # Sort by price (descending)
-        elif sort == 'rating':
-            queryset = queryset.order_by('-rating')  # Sort by rating (descending)
-        elif sort == 'newest':
-            queryset = queryset.order_by('-created_at')  # Sort by newest (descending)
-        else:
-            queryset = queryset.order_by('-is_featured')  # Default to featured products first
+        queryset = queryset.sorted(sort)  # Unknown values default to featured products first
+        # Load only the requested fields (and the ordering, which cursor pages read back)
+        queryset = queryset.for_fields(self.requested_fields())
 
         # Limit search results to 5 if a search query is provided
         if search_query:
-            return queryset[:5]
+            return queryset[:SEARCH_RESULT_LIMIT]
 
         return queryset
     
+    @action(detail=False, methods=['get'])
+    @conditional_catalog_response('facets')
+    @cached_catalog_response('facets')
+    def facets(self, request):
+        """Category, price and rating counts for the current search and category filter."""
+        searched = self.filter_products(Product.objects.available(), apply_categories=False)
+        return Response(compute_facets(self.filter_categories(searched), searched))
+
     @action(detail=False, methods=['get'])
     def featured(self, request):
-        featured_products = self.queryset.filter(is_featured=True)
-        serializer = self.get_serializer(featured_products, many=True)
-        return Response(serializer.data)
+        sideload = 'categories' in parse_sideload(request)
+        rows = ProductRows(self.requested_fields(), sideload_categories=sideload)
+        featured_products = rows.values(Product.objects.available().featured())
+        return Response(sideloaded_list(rows.serialize(list(featured_products)), sideload))
     
 class ContactViewSet(viewsets.ModelViewSet):
     queryset = Contact.objects.all()
@@ -91,28 +213,30 @@ class ContactViewSet(viewsets.ModelViewSet):
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        self.perform_create(serializer)
-
-        # Send acknowledgment email to the user
-        contact = serializer.instance
-        contact.send_acknowledgment_email()
-
-        # Send notification email to admin
-        subject = f"New Contact Form Submission: {contact.subject}"
-        html_message = render_to_string('emails/contact_notification_email.html', {
-            'name': contact.name,
-            'email': contact.email,
-            'subject': contact.subject,
-            'message': contact.message,
-        })
-        send_mail(
-            subject,
-            '',
-            settings.DEFAULT_FROM_EMAIL,
-            [settings.DEFAULT_FROM_EMAIL],
-            fail_silently=False,
-            html_message=html_message,
-        )
+
+        # The contact row and its emails are committed together; the outbox
+        # worker (manage.py process_outbox) does the actual delivery
+        with transaction.atomic():
+            self.perform_create(serializer)
+
+            # Queue acknowledgment email to the user
+            contact = serializer.instance
+            contact.send_acknowledgment_email()
+
+            # Queue notification email to admin
+            subject = f"New Contact Form Submission: {contact.subject}"
+            with timed('template'):
+                html_message = render_to_string('emails/contact_notification_email.html', {
+                    'name': contact.name,
+                    'email': contact.email,
+                    'subject': contact.subject,
+                    'message': contact.message,
+                })
+            OutboundEmail.queue(
+                subject,
+                [settings.DEFAULT_FROM_EMAIL],
+                html_body=html_message,
+            )
 
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
@@ -123,43 +247,49 @@ class NewsletterViewSet(viewsets.ModelViewSet):
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        self.perform_create(serializer)
 
-        # Send welcome email
-        subscriber = serializer.instance
-        subject = "Welcome to Our Newsletter!"
-        message = f"""
+        with transaction.atomic():
+            self.perform_create(serializer)
+
+            # Queue welcome email
+            subscriber = serializer.instance
+            subject = "Welcome to Our Newsletter!"
+            message = f"""
         Thank you for subscribing to our newsletter!
         We're excited to keep you updated with our latest products and offers.
         """
-        
-        send_mail(
-            subject,
-            message,
-            settings.DEFAULT_FROM_EMAIL,
-            [subscriber.email],
-            fail_silently=False,
-        )
-
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
-
-from django.core.mail import send_mail
-from django.conf import settings
 
+            OutboundEmail.queue(
+                subject,
+                [subscriber.email],
+                body=message,
+            )
 
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 import json
 
 
+MAX_ORDER_QUANTITY = 10  # Maximum units of a single product per order
 
 
-
+def priced_items(items, products):
+    """The order lines with the current product price filled in where the client sent none."""
+    return [
+        item if item.get('price') is not None else {**item, 'price': str(products[str(item.get('id'))].price)}
+        for item in items
+    ]
 
 
 class OrderViewSet(viewsets.ModelViewSet):
     queryset = Order.objects.all()
     serializer_class = OrderSerializer
 
+    def initialize_request(self, request, *args, **kwargs):
+        # Attachments are streamed to disk and hashed, never buffered in memory
+        request.upload_handlers = [HashingFileUploadHandler(request)]
+        return super().initialize_request(request, *args, **kwargs)
+
     def create(self, request, *args, **kwargs):
         # Extract data from the request
         platform = request.data.get('platform')
@@ -180,6 +310,7 @@ class OrderViewSet(viewsets.ModelViewSet):
         total_amount = order_details.get('total')
         customer_email = order_details.get('email')
         customer_name = order_details.get('name', 'Anonymous')  # Default to 'Anonymous' if not provided
+        cart = order_details.get('cart')  # Cart token whose stock reservations this order consumes
 
         # Validate required fields
         if not customer_email or not platform or not items or not total_amount:
@@ -188,57 +319,45 @@ class OrderViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        # Validate and process each item in the order
+        # Fetch every ordered product in a single query
+        products = Product.objects.in_bulk([str(item.get('id')) for item in items])
+
+        # Validate each item in the order; repeated lines for the same product
+        # are added up so stock is checked against the combined quantity
+        quantities = {}
         for item in items:
             product_id = item.get('id')
             quantity = item.get('quantity')
 
             # Validate product existence
-            try:
-                product = Product.objects.get(id=product_id)
-            except Product.DoesNotExist:
+            product = products.get(str(product_id))
+            if product is None:
                 return Response(
                     {"error": f"Product with ID {product_id} does not exist."},
                     status=status.HTTP_400_BAD_REQUEST,
                 )
 
-            # Validate stock availability
-            if product.stock < quantity:
-                return Response(
-                    {"error": f"Not enough stock for product '{product.name}'. Available: {product.stock}, Requested: {quantity}."},
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
-
             # Validate minimum and maximum order quantities
-            if quantity <= 0:
+            if not isinstance(quantity, int) or quantity <= 0:
                 return Response(
                     {"error": f"Invalid quantity for product '{product.name}'. Quantity must be greater than 0."},
                     status=status.HTTP_400_BAD_REQUEST,
                 )
-            MAX_ORDER_QUANTITY = 10
             if quantity > MAX_ORDER_QUANTITY:
                 return Response(
                     {"error": f"Cannot order more than {MAX_ORDER_QUANTITY} units of '{product.name}'."},
                     status=status.HTTP_400_BAD_REQUEST,
                 )
+            quantities[product.pk] = quantities.get(product.pk, 0) + quantity
 
-        # Deduct stock for each item
-        for item in items:
-            product_id = item.get('id')
-            quantity = item.get('quantity')
-            product = Product.objects.get(id=product_id)
-            product.stock -= quantity
-            product.save()
-
-        # Save the order to the database
-        order = Order.objects.create(
-            platform=platform,
-            customer_email=customer_email,
-            customer_name=customer_name,
-            order_details=items,  # Save the items as JSON
-            total_amount=total_amount,
-            file=file,
-        )
+        # Validate stock availability (fast path; the deduction below re-checks atomically)
+        for product_id, quantity in quantities.items():
+            product = products[product_id]
+            if product.stock < quantity:
+                return Response(
+                    {"error": f"Not enough stock for product '{product.name}'. Available: {product.stock}, Requested: {quantity}."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
 
         # Prepare platform-specific message
         platform_message = (
@@ -249,43 +368,66 @@ class OrderViewSet(viewsets.ModelViewSet):
                  "You can accept it so I can start your project."
         )
 
-        # Render client email
-        client_email_html = render_to_string('emails/client_email_template.html', {
-            'customer_name': customer_name,
-            'platform': platform,
-            'total_amount': total_amount,
-            'items': items,
-            'platform_message': platform_message,
-        })
-
-        # Render admin email
-        admin_email_html = render_to_string('emails/admin_email_template.html', {
-            'customer_name': customer_name,
-            'customer_email': customer_email,
-            'platform': platform,
-            'total_amount': total_amount,
-            'items': items,
-        })
+        with timed('template'):
+            # Render client email
+            client_email_html = render_to_string('emails/client_email_template.html', {
+                'customer_name': customer_name,
+                'platform': platform,
+                'total_amount': total_amount,
+                'items': items,
+                'platform_message': platform_message,
+            })
+
+            # Render admin email
+            admin_email_html = render_to_string('emails/admin_email_template.html', {
+                'customer_name': customer_name,
+                'customer_email': customer_email,
+                'platform': platform,
+                'total_amount': total_amount,
+                'items': items,
+            })
+
+        # Store the attachment before taking the write lock; a blob left
+        # behind by a failed order is removed by gc_order_files
+        file_name = store_order_file(file) if file else None
+
+        # Stock, the order and its emails are committed together. Each
+        # deduction is a conditional UPDATE, so a concurrent order (or another
+        # cart's reservation) makes it match no row instead of overselling.
+        try:
+            with transaction.atomic():
+                # Deduct stock for each item, consuming this cart's reservations
+                deduct_stock(quantities, products, cart=cart)
+                transaction.on_commit(bump_catalog_version)  # Listings filter on stock
+
+                # Save the order to the database
+                order = Order.objects.create(
+                    platform=platform,
+                    customer_email=customer_email,
+                    customer_name=customer_name,
+                    order_details=priced_items(items, products),  # Save the items as JSON
+                    total_amount=total_amount,
+                    file=file_name,
+                )
 
-        # Send email to the customer
-        send_mail(
-            subject="Thank you for your order!",
-            message="",
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[customer_email],
-            fail_silently=False,
-            html_message=client_email_html,
-        )
+                # Queue email to the customer
+                OutboundEmail.queue(
+                    "Thank you for your order!",
+                    [customer_email],
+                    html_body=client_email_html,
+                )
 
-        # Send email to the admin
-        send_mail(
-            subject=f"New Order Received from {customer_name}",
-            message="",
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[settings.DEFAULT_FROM_EMAIL],
-            fail_silently=False,
-            html_message=admin_email_html,
-        )
+                # Queue email to the admin
+                OutboundEmail.queue(
+                    f"New Order Received from {customer_name}",
+                    [settings.DEFAULT_FROM_EMAIL],
+                    html_body=admin_email_html,
+                )
+        except InsufficientStock as exc:
+            return Response(
+                {"error": f"Not enough stock for product '{exc.product.name}'. Requested: {exc.quantity}."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
 
         # Serialize and return the response
         serializer = self.get_serializer(order)
@@ -293,22 +435,195 @@ class OrderViewSet(viewsets.ModelViewSet):
 
 
 
-class ProductsByCategoryView(APIView):
-    def get(self, request, slug):
-        """Fetch products by category slug."""
-        print(f"DEBUG: Entered ProductsByCategoryView with slug={slug}")  # Debugging: Check the slug value
+class OrderAnalyticsViewSet(viewsets.ViewSet):
+    """
+    Sales figures for admins, answered from the daily rollups (see rollups.py).
+
+    Every action takes optional ``since`` and ``until`` dates (YYYY-MM-DD,
+    inclusive) and a comma-separated ``status`` list.
+    """
+    permission_classes = [IsAdminUser]
+    max_limit = 100
+
+    def get_filters(self, request):
+        filters = {}
+        for name in ('since', 'until'):
+            value = request.query_params.get(name)
+            if value:
+                try:
+                    filters[name] = parse_date(value)
+                except ValueError:
+                    filters[name] = None
+                if filters[name] is None:
+                    raise ValidationError({name: 'Expected a date in YYYY-MM-DD format.'})
+        statuses = request.query_params.get('status')
+        if statuses:
+            filters['statuses'] = [value.strip() for value in statuses.split(',') if value.strip()]
+        return filters
+
+    def format_rows(self, rows):
+        for row in rows:
+            row['revenue'] = '{:.2f}'.format(row['revenue'])
+        return rows
+
+    @action(detail=False, methods=['get'], url_path='revenue-by-day')
+    def revenue_by_day(self, request):
+        return Response(self.format_rows(rollups.revenue_by_day(**self.get_filters(request))))
+
+    @action(detail=False, methods=['get'], url_path='by-platform')
+    def by_platform(self, request):
+        return Response(self.format_rows(rollups.revenue_by_platform(**self.get_filters(request))))
+
+    @action(detail=False, methods=['get'], url_path='top-products')
+    def top_products(self, request):
+        try:
+            limit = min(max(int(request.query_params.get('limit', 10)), 1), self.max_limit)
+        except ValueError:
+            raise ValidationError({'limit': 'Expected a number.'})
+        return Response(self.format_rows(rollups.top_products(limit, **self.get_filters(request))))
+
+
+class StockReservationView(APIView):
+    """Hold stock for a cart during checkout (POST) and release the holds (DELETE)."""
+
+    def get(self, request, cart):
+        reservations = StockReservation.objects.filter(cart=cart, expires_at__gt=timezone.now())
+        return Response(
+            {
+                "cart": cart,
+                "items": [{"id": r.product_id, "quantity": r.quantity, "expires_at": r.expires_at} for r in reservations],
+            },
+            status=status.HTTP_200_OK,
+        )
+
+    def post(self, request, cart=None):
+        cart = cart or request.data.get('cart')
+        items = request.data.get('items')
+        if not cart or not isinstance(items, list) or not items:
+            return Response(
+                {"error": "Missing required fields: cart and items"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        products = Product.objects.in_bulk([str(item.get('id')) for item in items])
+        quantities = {}
+        for item in items:
+            product_id = item.get('id')
+            quantity = item.get('quantity')
+            product = products.get(str(product_id))
+            if product is None:
+                return Response(
+                    {"error": f"Product with ID {product_id} does not exist."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            if not isinstance(quantity, int) or quantity <= 0:
+                return Response(
+                    {"error": f"Invalid quantity for product '{product.name}'. Quantity must be greater than 0."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            quantities[product.pk] = quantities.get(product.pk, 0) + quantity
+            if quantities[product.pk] > MAX_ORDER_QUANTITY:
+                return Response(
+                    {"error": f"Cannot order more than {MAX_ORDER_QUANTITY} units of '{product.name}'."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
 
         try:
-            category = Category.objects.get(slug=slug)
-            print(f"DEBUG: Found category: {category}")  # Debugging: Check if the category is found
+            reservations = hold_stock(cart, quantities)
+        except InsufficientStock as exc:
+            return Response(
+                {"error": f"Not enough stock for product '{exc.product.name}'. Requested: {exc.quantity}."},
+                status=status.HTTP_409_CONFLICT,
+            )
+
+        return Response(
+            {
+                "cart": cart,
+                "expires_at": reservations[0].expires_at,
+                "items": [{"id": r.product_id, "quantity": r.quantity} for r in reservations],
+            },
+            status=status.HTTP_201_CREATED,
+        )
 
-            products = Product.objects.filter(category=category)
-            print(f"DEBUG: Found products: {products}")  # Debugging: Check the products queryset
+    def delete(self, request, cart):
+        release_cart(cart)
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
-            serializer = ProductSerializer(products, many=True)
-            print(f"DEBUG: Serialized products: {serializer.data}")  # Debugging: Check serialized data
 
-            return Response(serializer.data, status=status.HTTP_200_OK)
+class CatalogSnapshotView(APIView):
+    """Serve the precomputed category list, or one category's products, byte for byte."""
+
+    def get(self, request, slug=None):
+        category_id = None
+        key = snapshots.CATEGORIES_KEY
+        if slug is not None:
+            category_id = Category.objects.filter(slug=slug).values_list('pk', flat=True).first()
+            if category_id is None:
+                return Response({"error": "Category not found"}, status=status.HTTP_404_NOT_FOUND)
+            sort = request.query_params.get('sort')
+            if sort not in snapshots.SNAPSHOT_SORTS:
+                sort = DEFAULT_PRODUCT_SORT
+            key = snapshots.category_key(category_id, sort)
+
+        snapshot = snapshots.get_snapshot(key, category_id)
+        etag = quote_etag(snapshot.etag)
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            not_modified['ETag'] = etag
+            return not_modified
+
+        response = HttpResponse(snapshot.body, content_type='application/json')
+        response['ETag'] = etag
+        return response
+
+
+class CatalogExportView(APIView):
+    """Stream every product, with category, features and images, as NDJSON."""
+
+    def get(self, request):
+        response = StreamingHttpResponse(iter_catalog_ndjson(), content_type='application/x-ndjson')
+        response['Content-Disposition'] = 'attachment; filename="catalog.ndjson"'
+        return response
+
+
+class CatalogChangesView(APIView):
+    """
+    Products and categories changed or deleted since ``?since=<token>``.
+
+    Without a token (or with one too old to answer) the response only holds
+    a token and ``reset: true``: load the whole catalog, then poll with the token.
+    """
+
+    def get(self, request):
+        token = request.query_params.get('since')
+        try:
+            since = changes.decode_token(token) if token else None
+        except changes.InvalidToken:
+            return Response({"error": "Invalid 'since' token."}, status=status.HTTP_400_BAD_REQUEST)
+
+        result = changes.catalog_changes(since)
+        if result['reset']:
+            return Response({'token': result['token'], 'reset': True})
+        return Response({
+            'token': result['token'],
+            'reset': False,
+            'products': ProductSerializer(result['products'], many=True).data,
+            'categories': CategorySerializer(result['categories'], many=True).data,
+            'deleted': result['deleted'],
+        })
+
+
+class ProductsByCategoryView(APIView):
+    @conditional_catalog_response('products-by-category')
+    @cached_catalog_response('products-by-category')
+    def get(self, request, slug):
+        """Fetch products by category slug."""
+        try:
+            category = Category.objects.get(slug=slug)
         except Category.DoesNotExist:
-            print(f"DEBUG: Category with slug '{slug}' does not exist")  # Debugging: Category not found
-            return Response({"error": "Category not found"}, status=status.HTTP_404_NOT_FOUND)
\ No newline at end of file
+            return Response({"error": "Category not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        sideload = 'categories' in parse_sideload(request)
+        rows = ProductRows(sideload_categories=sideload)
+        products = rows.serialize(list(rows.values(Product.objects.filter(category=category))))
+        return Response(sideloaded_list(products, sideload), status=status.HTTP_200_OK)